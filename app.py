@@ -1,7 +1,26 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import json
-import pandas as pd
-from datetime import datetime
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from budget import BudgetAggregator
+from core import CATEGORIES, FX_RATES, blank_plan, convert, copy_plan, format_currency, seed_plan
+from export import FORMATS, export_bytes
+from history import History, describe, inverse
+from importer import iter_table, plan_import
+from library import LibraryIndex
+from optimizer import find_itineraries, group_alternatives
+from pricing import FX_FILE, describe as describe_pricing, format_tiers, has_rate, parse_tiers
+import profiling
+from storage import PLAN_FIELDS, ConflictError, PlanStore, apply_change, touched_keys
+from workspace import Workspace
+# pandas and NumPy (through sweep and risk) are imported inside the panels that
+# use them: the first render needs neither, and together they take longer to
+# import than that render takes to draw.
+
+run_started = time.perf_counter()
 
 # Page config
 st.set_page_config(
@@ -10,25 +29,10 @@ st.set_page_config(
     layout="wide"
 )
 
-# Custom CSS
-st.markdown("""
+# Custom CSS, rendered at the top of the page on every run. Background and
+# text colours come from the theme in .streamlit/config.toml instead.
+PAGE_CSS = """
 <style>
-    .main {
-        background-color: #1a1a1a;
-    }
-    .stApp {
-        background-color: #1a1a1a;
-    }
-    h1, h2, h3, h4, h5, h6, p, span, div, label {
-        color: #ffffff !important;
-    }
-    .event-card {
-        background: #2d2d2d;
-        border: 2px solid #404040;
-        border-radius: 8px;
-        padding: 1rem;
-        margin-bottom: 0.5rem;
-    }
     .category-badge {
         display: inline-block;
         padding: 0.25rem 0.75rem;
@@ -47,213 +51,556 @@ st.markdown("""
         gap: 0.5rem;
     }
 </style>
-""", unsafe_allow_html=True)
-
-# Categories
-CATEGORIES = {
-    "venue": "Venue",
-    "food": "Food & Beverage",
-    "other": "Other"
-}
+"""
 
 # Data file path
 DATA_FILE = "plan_data.json"
+# Set to a directory to hold many plans (plus a shared vendor catalog) instead of DATA_FILE
+WORKSPACE_DIR = os.environ.get("PLANNER_WORKSPACE")
+
+# Library cards per page, and matches offered by each day's "Add event" picker
+LIBRARY_PAGE_SIZE = 20
+PICKER_LIMIT = 25
+# How often an idle page checks whether a colleague saved changes
+# (a timedelta: Streamlit parses strings like "5s" with pandas, which would load it on the first run)
+SYNC_INTERVAL = timedelta(seconds=5)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def export_file(path, version, fmt, _plan, _costs):
+    """Export bytes for a plan version; unchanged plans are downloaded again without re-exporting"""
+    return export_bytes(_plan, _costs, fmt)
 
-# Initialize session state with IAPN data
+@st.cache_data(max_entries=8, show_spinner=False)
+def risk_simulation(path, version, draws, _plan):
+    """Monte Carlo results for a plan version; only rerun when the plan or the draw count changes"""
+    from risk import simulate
+    return simulate(_plan["events"], _plan["schedule"], _plan["days"], _plan["attendees"],
+                    _plan["attendeeUncertainty"], draws=draws)
+
+@st.cache_resource
+def default_store():
+    """One PlanStore per server process, shared by every session"""
+    return PlanStore(DATA_FILE)
+
+@st.cache_resource
+def get_workspace():
+    """The workspace (None outside workspace mode), shared by every session"""
+    return Workspace(WORKSPACE_DIR) if WORKSPACE_DIR else None
+
+@st.cache_resource(max_entries=2)
+def get_catalog(mtime):
+    """Vendor catalog and its search index, loaded once per server and shared read-only by every session"""
+    events = get_workspace().load_catalog()
+    return events, LibraryIndex(events, CATEGORIES)
+
+def get_store():
+    """Store for the plan this session has open"""
+    workspace = get_workspace()
+    if workspace:
+        return workspace.store(st.session_state.plan_id)
+    return default_store()
+
+@st.cache_resource(max_entries=8)
+def saved_plan(path, version, _store):
+    """(plan, version) as saved, read from disk once per server for every session that opens it
+
+    Shared by every session, so never edited: sessions work on copy_plan() copies.
+    """
+    return _store.load(default=seed_plan())
+
+def load_plan():
+    """Replace the session's copy of the plan with the latest saved one"""
+    store = get_store()
+    plan, version = saved_plan(store.path, store.version(), store)
+    plan = copy_plan(plan)
+    for key in PLAN_FIELDS:
+        st.session_state[key] = plan[key]
+    st.session_state.version = version
+    st.session_state.budget = BudgetAggregator(plan["events"], plan["schedule"], plan["attendees"])
+    st.session_state.library = LibraryIndex(plan["events"], CATEGORIES)
+    # Undo steps were computed against the old copy, so they start over
+    st.session_state.history = History(st.session_state.budget.total)
+
+# Initialize session state from the saved plan (or the IAPN seed on first run)
 def init_session_state():
     if 'initialized' not in st.session_state:
-        st.session_state.eventTitle = "IAPN 2027 May 21-24"
-        st.session_state.eventDescription = ""
-        st.session_state.attendees = 100
+        workspace = get_workspace()
+        if workspace:
+            # The plan named in the URL (?plan=<id>), else the one saved most recently
+            plans = workspace.plans()
+            requested = st.query_params.get("plan")
+            st.session_state.plan_id = requested if requested in plans else next(iter(plans))
+            st.query_params["plan"] = st.session_state.plan_id
+        load_plan()
         st.session_state.currency = "HKD"
-        st.session_state.nextEventId = 23
-        st.session_state.nextDayId = 5
-        st.session_state.has_unsaved = False
         st.session_state.editing_event = None
-        
-        # All events in library
-        st.session_state.events = [
-            {"id": 1, "name": "Welcome Reception in Murray", "description": "", "duration": "3 hours", "perPersonCost": 1180, "minimumCost": 140000, "category": "food"},
-            {"id": 5, "name": "Welcome Reception in Hyatt Regency", "description": "", "duration": "3 hours", "perPersonCost": 818, "minimumCost": 68800, "category": "food"},
-            {"id": 6, "name": "Gala Dinner in The Verandah", "description": "", "duration": "Dinner", "perPersonCost": 1628, "minimumCost": 360000, "category": "food"},
-            {"id": 9, "name": "Gala Dinner in Crown Wine Cellar", "description": "", "duration": "Dinner", "perPersonCost": 1688, "minimumCost": 110000, "category": "food"},
-            {"id": 10, "name": "Gala Dinner in WaterMark", "description": "", "duration": "Dinner", "perPersonCost": 0, "minimumCost": 168000, "category": "food"},
-            {"id": 11, "name": "Sai Kung Seafood Dinner", "description": "", "duration": "Dinner", "perPersonCost": 1000, "minimumCost": 0, "category": "food"},
-            {"id": 12, "name": "Star Ferry", "description": "110 passengers. 3 hours 45,000", "duration": "Cocktail", "perPersonCost": 0, "minimumCost": 45000, "category": "food"},
-            {"id": 15, "name": "Star Ferry Canapes/ Lunch", "description": "Canapes Room.", "duration": "Cocktail", "perPersonCost": 500, "minimumCost": 0, "category": "food"},
-            {"id": 2, "name": "Conference Hall Rental in Murray", "description": "Main venue for keynote sessions", "duration": "Half Day", "perPersonCost": 0, "minimumCost": 75000, "category": "venue"},
-            {"id": 7, "name": "Conference Hall Rental in Hyatt Regency", "description": "Main venue for keynote sessions", "duration": "Half Day", "perPersonCost": 0, "minimumCost": 40800, "category": "venue"},
-            {"id": 8, "name": "Conference Hall Rental in W Hotel", "description": "Main venue for keynote sessions", "duration": "Half Day", "perPersonCost": 0, "minimumCost": 118000, "category": "venue"},
-            {"id": 3, "name": "Workshop Session", "description": "Interactive training with materials", "duration": "4 hours", "perPersonCost": 1200, "minimumCost": 0, "category": "venue"},
-            {"id": 13, "name": "Tour Bus for Macau", "description": "2 buses, 1 bus 4500 full day estimate", "duration": "", "perPersonCost": 0, "minimumCost": 9000, "category": "other"},
-            {"id": 14, "name": "Macau Lunch - Portugese Food", "description": "Budget 500 per person", "duration": "", "perPersonCost": 500, "minimumCost": 0, "category": "other"},
-            {"id": 16, "name": "Sai Kung Alcohol Cost", "description": "Buy Bottles and bring there.", "duration": "", "perPersonCost": 299.98, "minimumCost": 0, "category": "other"},
-            {"id": 17, "name": "Dragon Dance Performance", "description": "", "duration": "", "perPersonCost": 0, "minimumCost": 10000, "category": "other"},
-            {"id": 18, "name": "Dim Sum Lunch", "description": "", "duration": "Lunch", "perPersonCost": 350, "minimumCost": 0, "category": "other"},
-            {"id": 19, "name": "Korean BBQ Dinner", "description": "", "duration": "Dinner", "perPersonCost": 800, "minimumCost": 0, "category": "other"},
-            {"id": 20, "name": "Star Ferry Alcohol Cost", "description": "", "duration": "Lunch", "perPersonCost": 300, "minimumCost": 0, "category": "other"},
-            {"id": 21, "name": "Murray Lunch", "description": "", "duration": "", "perPersonCost": 600, "minimumCost": 0, "category": "other"},
-            {"id": 22, "name": "Jocky Club Lunch- Saturday/ Sunday", "description": "Wouldnt know until the race schedule out in 2026.", "duration": "", "perPersonCost": 830, "minimumCost": 0, "category": "other"}
-        ]
-        
-        # Days
-        st.session_state.days = [
-            {"id": "day1", "label": "Day 1", "notes": ""},
-            {"id": "day2", "label": "Day 2", "notes": "Murray Conference->Star Ferry Lunch->Sai Kung Seafood Dinner"},
-            {"id": "day3", "label": "Day 3", "notes": "Macau Day Trip->Lunch in Macau-> Come BackBBQ"},
-            {"id": "day4", "label": "Day 4", "notes": "Conference->Dim Sum->Gala"}
-        ]
-        
-        # Schedule (events assigned to days)
-        st.session_state.schedule = {
-            "day1": [{"id": 1, "name": "Welcome Reception in Murray", "description": "", "duration": "3 hours", "perPersonCost": 1180, "minimumCost": 140000, "category": "food"}],
-            "day2": [
-                {"id": 2, "name": "Conference Hall Rental in Murray", "description": "Main venue for keynote sessions", "duration": "Half Day", "perPersonCost": 0, "minimumCost": 75000, "category": "venue"},
-                {"id": 11, "name": "Sai Kung Seafood Dinner", "description": "", "duration": "Dinner", "perPersonCost": 1000, "minimumCost": 0, "category": "food"},
-                {"id": 16, "name": "Sai Kung Alcohol Cost", "description": "Buy Bottles and bring there.", "duration": "", "perPersonCost": 299.98, "minimumCost": 0, "category": "other"},
-                {"id": 17, "name": "Dragon Dance Performance", "description": "", "duration": "", "perPersonCost": 0, "minimumCost": 10000, "category": "other"},
-                {"id": 12, "name": "Star Ferry", "description": "110 passengers. 3 hours 45,000", "duration": "Cocktail", "perPersonCost": 0, "minimumCost": 45000, "category": "food"},
-                {"id": 15, "name": "Star Ferry Canapes/ Lunch", "description": "Canapes Room.", "duration": "Cocktail", "perPersonCost": 500, "minimumCost": 0, "category": "food"},
-                {"id": 20, "name": "Star Ferry Alcohol Cost", "description": "", "duration": "Lunch", "perPersonCost": 300, "minimumCost": 0, "category": "other"}
-            ],
-            "day3": [
-                {"id": 13, "name": "Tour Bus for Macau", "description": "2 buses, 1 bus 4500 full day estimate", "duration": "", "perPersonCost": 0, "minimumCost": 9000, "category": "other"},
-                {"id": 14, "name": "Macau Lunch - Portugese Food", "description": "Budget 500 per person", "duration": "", "perPersonCost": 500, "minimumCost": 0, "category": "other"},
-                {"id": 19, "name": "Korean BBQ Dinner", "description": "", "duration": "Dinner", "perPersonCost": 800, "minimumCost": 0, "category": "other"}
-            ],
-            "day4": [
-                {"id": 2, "name": "Conference Hall Rental in Murray", "description": "Main venue for keynote sessions", "duration": "Half Day", "perPersonCost": 0, "minimumCost": 75000, "category": "venue"},
-                {"id": 18, "name": "Dim Sum Lunch", "description": "", "duration": "Lunch", "perPersonCost": 350, "minimumCost": 0, "category": "other"},
-                {"id": 6, "name": "Gala Dinner in The Verandah", "description": "", "duration": "Dinner", "perPersonCost": 1628, "minimumCost": 360000, "category": "food"}
-            ]
-        }
-        
+        st.session_state.editing_base = None
+        st.session_state.last_saved = None
+        st.session_state.sync_notice = None
+        st.session_state.latency = {}
+        st.session_state.library_page = 0
+        st.session_state.import_round = 0
         st.session_state.initialized = True
 
-def calculate_event_cost(event, attendees):
-    """Calculate event cost based on per person and minimum"""
-    per_person = event.get('perPersonCost', 0) * attendees
-    minimum = event.get('minimumCost', 0)
-    return max(per_person, minimum)
+def apply_to_session(change):
+    """Apply one change to the session plan, keeping the totals and search index in step"""
+    st.session_state.budget.observe(st.session_state, change)
+    st.session_state.library.observe(st.session_state, change)
+    apply_change(st.session_state, change)
 
-def format_currency(amount, currency):
-    """Format currency based on selected currency"""
-    if currency == "USD":
-        return f"US${amount:,.2f}"
+def sync_plan():
+    """Catch up with changes other sessions have saved since this session's version"""
+    store = get_store()
+    if store.version() == st.session_state.version:
+        return False
+    records, version = store.changes_since(st.session_state.version)
+    if records is None:
+        # Too far behind to replay (the journal was compacted past us)
+        load_plan()
     else:
-        return f"HK${amount:,.0f}"
-
-def get_total_budget():
-    """Calculate total budget across all scheduled events"""
-    total = 0
-    for day_id, events in st.session_state.schedule.items():
-        for event in events:
-            total += calculate_event_cost(event, st.session_state.attendees)
-    return total
-
-def get_total_scheduled_events():
-    """Count total scheduled events"""
-    return sum(len(events) for events in st.session_state.schedule.values())
-
-# Initialize
-init_session_state()
-
-# Header
-st.title("🎯 Event & Travel Budget Planner")
-
-# Top row - Event info
-col1, col2 = st.columns([3, 1])
-with col1:
-    st.session_state.eventTitle = st.text_input("Event/Trip Name", st.session_state.eventTitle)
-    st.session_state.eventDescription = st.text_area("Description", st.session_state.eventDescription, height=100)
-
-with col2:
-    st.write("Attendees")
-    col_minus, col_num, col_plus = st.columns([1, 2, 1])
-    with col_minus:
-        if st.button("➖"):
-            if st.session_state.attendees > 1:
-                st.session_state.attendees -= 1
-                st.session_state.has_unsaved = True
-                st.rerun()
-    with col_num:
-        st.markdown(f"<h2 style='text-align: center; margin: 0;'>{st.session_state.attendees}</h2>", unsafe_allow_html=True)
-    with col_plus:
-        if st.button("➕"):
-            st.session_state.attendees += 1
-            st.session_state.has_unsaved = True
-            st.rerun()
-    
-    # Currency toggle
-    col_hkd, col_usd = st.columns(2)
-    with col_hkd:
-        if st.button("HKD", type="primary" if st.session_state.currency == "HKD" else "secondary", use_container_width=True):
-            st.session_state.currency = "HKD"
-            st.rerun()
-    with col_usd:
-        if st.button("USD", type="primary" if st.session_state.currency == "USD" else "secondary", use_container_width=True):
-            st.session_state.currency = "USD"
-            st.rerun()
-
-# Auto-save indicator
-current_time = datetime.now().strftime("%I:%M:%S %p")
-st.success(f"✓ Auto-saved at {current_time}")
+        for change in records:
+            apply_to_session(change)
+        st.session_state.history.invalidate(set().union(*map(touched_keys, records)))
+        follow_editing_base(records, version)
+        st.session_state.version = version
+    st.session_state.sync_notice = "↻ Updated with changes from another session"
+    return True
 
-# Budget summary cards
-total_budget = get_total_budget()
-per_person_cost = total_budget / st.session_state.attendees if st.session_state.attendees > 0 else 0
-total_events = get_total_scheduled_events()
+def commit(*changes, label=None, record=True, base_version=None):
+    """Save changes and apply them to the session plan
+
+    Edits other sessions saved in the meantime are merged in first. If one of
+    them touched the same event, day or field, nothing is saved and the
+    session reloads the plan instead. Returns whether the changes were saved.
+
+    The changes are checked against edits made since ``base_version``
+    (default: the session's version); the event editor passes the version its
+    copy of the event was taken at.
+
+    With ``record``, the changes become one undo step, called ``label`` (or
+    described from the first change).
+    """
+    try:
+        version, theirs = get_store().append(
+            changes, st.session_state.version if base_version is None else base_version
+        )
+    except ConflictError:
+        load_plan()
+        st.session_state.sync_notice = "⚠️ Someone else just changed the same item, so your edit was not saved. The plan has been refreshed."
+        return False
+    history = st.session_state.history
+    # From an older base, some of theirs were already synced into the session
+    theirs = [change for change in theirs if change["seq"] > st.session_state.version]
+    for change in theirs:
+        apply_to_session(change)
+    if theirs:
+        history.invalidate(set().union(*map(touched_keys, theirs)))
+        st.session_state.sync_notice = "↻ Merged with changes from another session"
+    record = record and bool(changes)
+    if record:
+        label = label or describe(st.session_state, changes[0])
+    undo = []
+    for change in changes:
+        note_interaction(change["op"])
+        if record:
+            # Each inverse is worked out just before its change, and they undo in reverse order
+            undo[:0] = inverse(st.session_state, change)
+        apply_to_session(change)
+    if record:
+        history.record(label, changes, undo, st.session_state.budget.total)
+    follow_editing_base(theirs, version)
+    st.session_state.version = version
+    st.session_state.last_saved = datetime.now()
+    workspace = get_workspace()
+    if workspace:
+        workspace.record(st.session_state.plan_id, st.session_state, st.session_state.budget.total, version)
+    return True
+
+def open_plan(plan_id):
+    """Switch this session to another workspace plan"""
+    st.session_state.plan_id = plan_id
+    st.query_params["plan"] = plan_id
+    st.session_state.editing_event = None
+    st.session_state.editing_base = None
+    st.session_state.library_page = 0
+    load_plan()
+
+def create_plan():
+    title = st.session_state.new_plan_title.strip()
+    if title:
+        open_plan(get_workspace().create(blank_plan(title)))
+        st.session_state.new_plan_title = ""
+
+def plan_label(plan_id):
+    entry = get_workspace().plans().get(plan_id, {})
+    return f"{entry.get('title', plan_id)} · {format_currency(entry.get('total', 0), 'HKD')}"
+
+def workspace_sidebar():
+    """Plan switcher, listed from the workspace index without opening any plan file"""
+    workspace = get_workspace()
+    if not workspace:
+        return
+    with st.sidebar:
+        st.subheader("🗂️ Plans")
+        plans = workspace.plans()
+        if st.session_state.plan_id not in plans:
+            plans = {st.session_state.plan_id: {}, **plans}
+        st.session_state.plan_picker = st.session_state.plan_id
+        st.selectbox("Open plan", list(plans), key="plan_picker", format_func=plan_label,
+                     on_change=lambda: open_plan(st.session_state.plan_picker))
+        st.caption(f"{len(plans)} plans")
+        st.text_input("New plan", key="new_plan_title", placeholder="Trip name", on_change=create_plan)
+
+def travel_to(position):
+    """Undo or redo this session's edits until ``position`` steps are applied, saved as one change"""
+    history = st.session_state.history
+    if position == history.position:
+        return
+    undone = position < history.position
+    note_interaction("undo" if undone else "redo")
+    steps = history.steps_to(position)
+    if commit(*history.changes_to(position), record=False):
+        history.moved(steps, undone)
+
+
+# Target render time per interaction, in milliseconds. "app" is a full rerun;
+# the rest are fragment reruns of that part of the page.
+LATENCY_TARGET_MS = {
+    "app": 800,
+    "summary": 50,
+    "day": 150,
+    "library": 300,
+    "editor": 100,
+    "sweep": 300,
+    "itinerary": 500,
+    "risk": 500,
+    "history": 200
+}
+
+@contextmanager
+def timed(section):
+    """Record how long a section took to render, and its cost calls and widgets when profiling"""
+    profiler = st.session_state.get("profiler")
+    started = time.perf_counter()
+    with profiler.section(section) if profiler else nullcontext():
+        yield
+    if section in LATENCY_TARGET_MS:
+        st.session_state.latency[section] = (time.perf_counter() - started) * 1000
 
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.markdown(f"""
+def start_profiling():
+    """Profile this session's runs while ?profile=1 (or PLANNER_PROFILE=1) is set"""
+    if not profiling.enabled(st.query_params):
+        st.session_state.pop("profiler", None)
+        return
+    profiling.instrument()
+    if "profiler" not in st.session_state:
+        st.session_state.profiler = profiling.RunProfiler(get_script_run_ctx().session_id)
+    st.session_state.profiler.begin()
+
+def note_interaction(name):
+    """Label the current run for the profiler's per-interaction percentiles"""
+    if st.session_state.get("profiler"):
+        st.session_state.profiler.note(name)
+
+def rerun_parts(*keys):
+    """From a widget callback, rerun only the named fragments plus the totals
+
+    Panels that read the whole plan (sweep, itinerary, risk, history) would go
+    stale, so while one of them is open this falls back to a full rerun. So
+    does merging in another session's edits, which can touch any part of the page.
+    """
+    if st.session_state.sync_notice or any(
+        st.session_state.get(panel) for panel in ("show_sweep", "show_itinerary", "show_risk", "show_history")
+    ):
+        st.rerun()
+    keys = [*keys, "summary", "latency"]
+    if st.session_state.get("profiler"):
+        # Last, so it shows the record of this whole rerun
+        keys.append("profile")
+    st.rerun(keys)
+
+@st.fragment(key="summary")
+def summary_panel():
+    """Auto-save indicator and budget summary cards (read from the running totals, not recomputed)"""
+    with timed("summary"):
+        budget = st.session_state.budget
+        total_budget = budget.total
+        per_person_cost = total_budget / st.session_state.attendees if st.session_state.attendees > 0 else 0
+        total_events = budget.count
+        # Totals are kept in HKD; the cards also show them in the chosen currency (USD while that's HKD)
+        other = st.session_state.currency if st.session_state.currency != "HKD" else "USD"
+        
+        # Auto-save indicator, plus a one-off note when another session's edits came in
+        if st.session_state.sync_notice:
+            st.info(st.session_state.sync_notice)
+            st.session_state.sync_notice = None
+        if st.session_state.last_saved:
+            st.success(f"✓ Auto-saved at {st.session_state.last_saved.strftime('%I:%M:%S %p')}")
+        else:
+            st.success(f"✓ Loaded from {get_store().path}")
+        # Quotes in a currency fx_rates.json has no rate for are priced at 0 (see pricing.py)
+        events = st.session_state.events
+        unpriced = sorted({
+            events[event_id]['currency'] for event_ids in st.session_state.schedule.values()
+            for event_id in event_ids if not has_rate(events[event_id])
+        })
+        if unpriced:
+            st.warning(f"No exchange rate for {', '.join(unpriced)}, so those events count as 0 in the totals. "
+                       f"Add the rate to {FX_FILE} or change the events' currency.")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown(f"""
     <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 1.5rem; border-radius: 10px; color: white; text-align: center;'>
         <div style='font-size: 0.9rem; opacity: 0.9; margin-bottom: 0.5rem;'>Total Budget</div>
         <div style='font-size: 2rem; font-weight: bold;'>{format_currency(total_budget, 'HKD')}</div>
-        <div style='font-size: 1rem; opacity: 0.9; margin-top: 0.3rem;'>≈ {format_currency(total_budget / 7.8, 'USD')}</div>
+        <div style='font-size: 1rem; opacity: 0.9; margin-top: 0.3rem;'>≈ {format_currency(convert(total_budget, other), other)}</div>
     </div>
     """, unsafe_allow_html=True)
 
-with col2:
-    st.markdown(f"""
+        with col2:
+            st.markdown(f"""
     <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 1.5rem; border-radius: 10px; color: white; text-align: center;'>
         <div style='font-size: 0.9rem; opacity: 0.9; margin-bottom: 0.5rem;'>Per Person Cost</div>
         <div style='font-size: 2rem; font-weight: bold;'>{format_currency(per_person_cost, 'HKD')}</div>
-        <div style='font-size: 1rem; opacity: 0.9; margin-top: 0.3rem;'>≈ {format_currency(per_person_cost / 7.8, 'USD')}</div>
+        <div style='font-size: 1rem; opacity: 0.9; margin-top: 0.3rem;'>≈ {format_currency(convert(per_person_cost, other), other)}</div>
     </div>
     """, unsafe_allow_html=True)
 
-with col3:
-    st.markdown(f"""
+        with col3:
+            st.markdown(f"""
     <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 1.5rem; border-radius: 10px; color: white; text-align: center;'>
         <div style='font-size: 0.9rem; opacity: 0.9; margin-bottom: 0.5rem;'>Events Scheduled</div>
         <div style='font-size: 2rem; font-weight: bold;'>{total_events}</div>
     </div>
     """, unsafe_allow_html=True)
 
-st.markdown("---")
+        st.caption(" · ".join(
+            f"{label}: {format_currency(budget.category_totals.get(category, 0), 'HKD')}"
+            for category, label in CATEGORIES.items()
+        ))
 
-# Main content - Two columns
-left_col, right_col = st.columns([1, 2])
+@st.fragment(run_every=SYNC_INTERVAL)
+def sync_poller():
+    """Poll the tiny version file; redraw the page only when another session saved"""
+    if get_store().version() != st.session_state.version:
+        st.rerun()
 
-with left_col:
-    st.subheader("📋 Event Library")
-    
-    # Add new event button
-    if st.button("➕ Add New Event", use_container_width=True):
-        st.session_state.editing_event = {
-            "id": st.session_state.nextEventId,
-            "name": "",
-            "description": "",
-            "duration": "",
-            "perPersonCost": 0,
-            "minimumCost": 0,
-            "category": "other"
-        }
-        st.session_state.nextEventId += 1
-    
-    # Event editor (if editing)
-    if st.session_state.editing_event:
+@st.fragment(key="profile")
+def profile_panel():
+    """Where the last run's time went, and rolling percentiles per interaction (profiling only)"""
+    profiler = st.session_state.get("profiler")
+    if not profiler:
+        return
+    # Reruns after the other fragments of a click, so their record is complete by now
+    profiler.close_fragments()
+    if not profiler.last:
+        return
+    import pandas as pd
+    record = profiler.last
+    with st.expander(f"🔬 Profile: {record['kind']} run, {record['interaction']}, {record['totalMs']:.0f} ms"):
+        st.dataframe(pd.DataFrame(
+            [{"Section": name, "ms": values["ms"], "Cost calls": values["costCalls"], "Widgets": values["widgets"], "Runs": values["runs"]}
+             for name, values in sorted(record["sections"].items(), key=lambda item: -item[1]["ms"])]
+        ), hide_index=True, width="stretch")
+        st.dataframe(pd.DataFrame(
+            [{"Interaction": interaction, "Runs": runs, "p50 ms": p50, "p95 ms": p95}
+             for interaction, (runs, p50, p95) in profiler.stats().items()]
+        ), hide_index=True, width="stretch")
+        st.caption(f"Every run is appended to {profiler.log_path}")
+
+@st.fragment(key="latency")
+def latency_panel():
+    """Latest render time of each part of the page against its target"""
+    st.caption(" · ".join(
+        f"{'⚡' if ms <= LATENCY_TARGET_MS[section] else '🐢'} {section} {ms:.0f} ms (target {LATENCY_TARGET_MS[section]} ms)"
+        for section, ms in st.session_state.latency.items()
+    ))
+
+@st.fragment
+def sweep_panel():
+    if not st.toggle("📈 Attendee sweep & break-even", key="show_sweep"):
+        return
+    import numpy as np
+    import pandas as pd
+    from sweep import break_even, pack_plan, sweep
+    with timed("sweep"):
+        packed = pack_plan(st.session_state.events, st.session_state.schedule, st.session_state.days)
+        low, high = st.slider("Attendee range", 1, 2000, (1, max(300, st.session_state.attendees * 2)))
+        currency = st.session_state.currency
+        curve = sweep(packed, range(low, high + 1), currency)
+        st.line_chart(pd.DataFrame(
+            {f"Total ({currency})": curve["total"], f"Per person ({currency})": curve["per_person"]},
+            index=pd.Index(curve["attendees"].astype(int), name="Attendees")
+        ))
+
+        col_a, col_b = st.columns(2)
+        with col_a:
+            compare_a = st.number_input("Compare attendees", min_value=1, value=80)
+        with col_b:
+            compare_b = st.number_input("with attendees", min_value=1, value=140)
+        compared = sweep(packed, [compare_a, compare_b], currency)
+        st.dataframe(pd.DataFrame({
+            "Attendees": [compare_a, compare_b],
+            f"Total ({currency})": compared["total"],
+            f"Per person ({currency})": compared["per_person"],
+            **{day['label']: compared["per_day"][:, d] for d, day in enumerate(st.session_state.days)}
+        }), hide_index=True, width="stretch")
+
+        # Events charged by headcount (per person, per coach, by tier) above a minimum spend
+        thresholds = break_even(packed)
+        st.dataframe(pd.DataFrame([
+            {
+                "Event": st.session_state.events[event_id]['name'],
+                "Per person": packed["per_person"][e],
+                "Minimum": packed["minimum"][e],
+                "Per-person pricing from": int(thresholds[e]),
+            }
+            for e, event_id in enumerate(packed["event_ids"])
+            if packed["minimum"][e] > 0 and np.isfinite(thresholds[e])
+        ]), hide_index=True, width="stretch")
+
+@st.fragment
+def itinerary_panel():
+    if not st.toggle("🧮 Cheapest itinerary", key="show_itinerary"):
+        return
+    with timed("itinerary"):
+        alternatives = {key: ids for key, ids in group_alternatives(st.session_state.events).items() if len(ids) > 1}
+        col_cap, col_k = st.columns(2)
+        with col_cap:
+            budget_cap = st.number_input("Budget cap (HKD, 0 = none)", min_value=0.0, value=0.0, step=10000.0)
+        with col_k:
+            top_k = st.slider("Itineraries to show", 1, 5, 3)
+        once_per_trip = st.multiselect("Exactly one per trip", sorted(alternatives), format_func=str.title)
+        required = st.multiselect("Every day must include", list(CATEGORIES.keys()), format_func=CATEGORIES.get)
+
+        itineraries, complete = find_itineraries(
+            st.session_state.events,
+            st.session_state.days,
+            st.session_state.schedule,
+            st.session_state.attendees,
+            k=top_k,
+            budget_cap=budget_cap or None,
+            group_counts={key: 1 for key in once_per_trip},
+            required_categories={day['id']: required for day in st.session_state.days}
+        )
+        if not complete:
+            st.warning("Search stopped early: these are the cheapest itineraries found so far, and cheaper ones may exist. "
+                       "Fewer constraints or a smaller schedule let it finish.")
+        elif not itineraries:
+            st.warning("No itinerary satisfies these constraints")
+        for rank, itinerary in enumerate(itineraries):
+            saving = st.session_state.budget.total - itinerary['total']
+            st.markdown(f"**#{rank + 1}: {format_currency(itinerary['total'], 'HKD')}** (saves {format_currency(saving, 'HKD')})")
+            labels = {day['id']: day['label'] for day in st.session_state.days}
+            for day_id, old_id, new_id in itinerary['changes']:
+                new_name = st.session_state.events[new_id]['name'] if new_id is not None else "(removed)"
+                st.caption(f"{labels[day_id]}: {st.session_state.events[old_id]['name']} → {new_name}")
+            if itinerary['changes'] and st.button("Apply", key=f"apply_itinerary_{rank}"):
+                commit(*(
+                    {"op": "set_day", "day_id": day_id, "event_ids": event_ids}
+                    for day_id, event_ids in itinerary['schedule'].items()
+                    if event_ids != st.session_state.schedule[day_id]
+                ), label=f"Apply itinerary #{rank + 1}")
+                st.rerun()
+
+
+@st.fragment
+def risk_panel():
+    if not st.toggle("🎲 Budget risk (Monte Carlo)", key="show_risk"):
+        return
+    import numpy as np
+    import pandas as pd
+    with timed("risk"):
+        attendees = st.session_state.attendees
+        spec = st.session_state.attendeeUncertainty or {}
+        col_low, col_high, col_draws = st.columns(3)
+        with col_low:
+            low = st.number_input("Fewest attendees", min_value=1, value=int(spec.get("low", attendees)))
+        with col_high:
+            high = st.number_input("Most attendees", min_value=1, value=int(spec.get("high", attendees)))
+        with col_draws:
+            draws = st.select_slider("Simulated trips", [10_000, 100_000, 250_000, 1_000_000], value=100_000)
+        # A fixed headcount unless the range is wider than a single number
+        new_spec = {"dist": "triangular", "low": min(low, high), "high": max(low, high)} if low != high else None
+        if new_spec != st.session_state.attendeeUncertainty:
+            commit({"op": "set", "field": "attendeeUncertainty", "value": new_spec})
+
+        plan = {key: st.session_state[key] for key in ("events", "schedule", "days", "attendees", "attendeeUncertainty")}
+        result = risk_simulation(get_store().path, st.session_state.version, draws, plan)
+        point = st.session_state.budget.total
+        col_point, *col_percentiles = st.columns(4)
+        with col_point:
+            st.metric("Point estimate", format_currency(point, 'HKD'))
+        for col, p in zip(col_percentiles, ("p50", "p90", "p99")):
+            with col:
+                st.metric(p.upper(), format_currency(result["total"][p], 'HKD'),
+                          f"{result['total'][p] - point:+,.0f}", delta_color="inverse")
+
+        counts, edges = np.histogram(result["totals"], bins=40)
+        st.bar_chart(pd.DataFrame(
+            {"Simulated trips": counts},
+            index=pd.Index(((edges[:-1] + edges[1:]) / 2).round(-3).astype(int), name="Total (HKD)")
+        ))
+
+        col_days, col_drivers = st.columns(2)
+        with col_days:
+            st.dataframe(pd.DataFrame([
+                {
+                    "Day": day['label'],
+                    "Point": st.session_state.budget.day_totals.get(day['id'], 0),
+                    **{p.upper(): result["per_day"][day['id']][p] for p in ("p50", "p90", "p99")},
+                }
+                for day in st.session_state.days
+            ]), hide_index=True, width="stretch")
+        with col_drivers:
+            st.dataframe(pd.DataFrame(
+                [{"Event": st.session_state.events[event_id]['name'], "Share of variance": f"{share:.0%}"}
+                 for event_id, share in result["drivers"]],
+                columns=["Event", "Share of variance"]
+            ), hide_index=True, width="stretch")
+
+def jump_in_history():
+    travel_to(st.session_state.history_position)
+    # Any part of the plan may have changed, not just this panel
+    st.rerun()
+
+@st.fragment
+def history_panel():
+    if not st.toggle("🕓 History", key="show_history"):
+        return
+    import pandas as pd
+    with timed("history"):
+        history = st.session_state.history
+        steps = history.steps()
+        if not steps:
+            st.caption("Edits made in this session will show up here, ready to undo or revisit.")
+            return
+        labels = ["Start of session"] + [step['label'] for step in steps]
+        st.session_state.history_position = history.position
+        st.select_slider(
+            "Jump to", range(len(labels)), key="history_position", on_change=jump_in_history,
+            format_func=lambda position: f"{position}. {labels[position]}"
+        )
+        # How the budget moved, one point per step (steps after the current one are there to redo)
+        totals = [history.start_total] + [step['total'] for step in steps]
+        st.line_chart(pd.DataFrame({"Total (HKD)": totals}, index=pd.Index(range(len(totals)), name="Step")))
+        st.dataframe(pd.DataFrame([
+            {
+                "Step": position,
+                "Change": labels[position],
+                "Total": format_currency(totals[position], 'HKD'),
+                "Δ": f"{totals[position] - totals[position - 1]:+,.0f}" if position else "",
+                "": "◀ now" if position == history.position else ("undone" if position > history.position else ""),
+            }
+            for position in range(len(labels))
+        ]), hide_index=True, width="stretch")
+
+@st.fragment
+def event_editor():
+    if not st.session_state.editing_event:
+        return
+    with timed("editor"):
         with st.form("event_form"):
             st.write("### Edit Event")
             name = st.text_input("Event Name", st.session_state.editing_event.get('name', ''))
@@ -261,15 +608,64 @@ with left_col:
             duration = st.text_input("Duration", st.session_state.editing_event.get('duration', ''))
             category = st.selectbox("Category", list(CATEGORIES.keys()), 
                                    index=list(CATEGORIES.keys()).index(st.session_state.editing_event.get('category', 'other')))
-            per_person = st.number_input("Per Person Cost (HKD)", value=float(st.session_state.editing_event.get('perPersonCost', 0)))
-            minimum = st.number_input("Minimum Cost (HKD)", value=float(st.session_state.editing_event.get('minimumCost', 0)))
+            # An event from a server with other rates keeps its currency listed, but can't be saved with it
+            current_currency = st.session_state.editing_event.get('currency', 'HKD')
+            currencies = list(FX_RATES) + ([current_currency] if current_currency not in FX_RATES else [])
+            quote_currency = st.selectbox("Quoted in", currencies, index=currencies.index(current_currency))
+            per_person = st.number_input("Per Person Cost", value=float(st.session_state.editing_event.get('perPersonCost', 0)))
+            minimum = st.number_input("Minimum Cost", value=float(st.session_state.editing_event.get('minimumCost', 0)))
+            
+            # Quotes that aren't just per person above a minimum (see pricing.py); blank or 0 means unused
+            pricing = st.session_state.editing_event.get('pricing', {})
+            with st.expander("Pricing model"):
+                fixed = st.number_input("Fixed fee", min_value=0.0, value=float(pricing.get('fixed', 0)))
+                col_unit, col_size = st.columns(2)
+                with col_unit:
+                    unit_cost = st.number_input("Cost per unit (coach, boat, room)", min_value=0.0,
+                                                value=float(pricing.get('unitCost', 0)))
+                with col_size:
+                    unit_size = st.number_input("People per unit", min_value=1, value=int(pricing.get('unitSize', 1)))
+                tiers_text = st.text_input("Per-person tiers (from:rate)", format_tiers(pricing.get('tiers', [])),
+                                           help="e.g. 50:880, 100:820 -- the rate from 50 people, then from 100")
+                maximum = st.number_input("Cap (0 = none)", min_value=0.0, value=float(pricing.get('maximum') or 0))
+            
+            # Price ranges for the budget-risk simulation; equal low and high means a firm price
+            uncertainty = st.session_state.editing_event.get('uncertainty', {})
+            ranges = {}
+            with st.expander("Price range (estimates)"):
+                fields = [("perPersonCost", "Per person", per_person), ("minimumCost", "Minimum", minimum)]
+                if pricing.get('unitCost'):
+                    fields.append(("unitCost", "Per unit", unit_cost))
+                for field, label, point in fields:
+                    spec = uncertainty.get(field, {})
+                    col_low, col_high = st.columns(2)
+                    with col_low:
+                        low = st.number_input(f"{label} low", value=float(spec.get('low', point)))
+                    with col_high:
+                        high = st.number_input(f"{label} high", value=float(spec.get('high', point)))
+                    if low != high:
+                        ranges[field] = {"dist": "triangular", "low": min(low, high), "high": max(low, high)}
             
             col_save, col_cancel = st.columns(2)
             with col_save:
-                if st.form_submit_button("💾 Save", use_container_width=True):
-                    # Update or add event
+                if st.form_submit_button("💾 Save", width="stretch"):
+                    try:
+                        tiers = parse_tiers(tiers_text)
+                    except ValueError as e:
+                        st.error(str(e))
+                        return
+                    if quote_currency not in FX_RATES:
+                        st.error(f"No exchange rate for {quote_currency}; add it to {FX_FILE} or pick another currency")
+                        return
+                    # Update or add event; a new one takes its id now, so an id another
+                    # session has used since the editor opened isn't handed out again
+                    event_id = st.session_state.editing_event['id']
+                    if event_id is None:
+                        event_id = st.session_state.nextEventId
+                    # Keep fields this form doesn't edit (e.g. an alternatives group)
                     updated_event = {
-                        "id": st.session_state.editing_event['id'],
+                        **st.session_state.editing_event,
+                        "id": event_id,
                         "name": name,
                         "description": description,
                         "duration": duration,
@@ -277,107 +673,438 @@ with left_col:
                         "minimumCost": minimum,
                         "category": category
                     }
+                    updated_event.pop('uncertainty', None)
+                    if ranges:
+                        updated_event['uncertainty'] = ranges
+                    updated_event.pop('currency', None)
+                    if quote_currency != "HKD":
+                        updated_event['currency'] = quote_currency
+                    model = {"fixed": fixed, "unitCost": unit_cost, "tiers": tiers, "maximum": maximum}
+                    model = {key: value for key, value in model.items() if value}
+                    if unit_cost:
+                        model['unitSize'] = unit_size
+                    updated_event.pop('pricing', None)
+                    if model:
+                        updated_event['pricing'] = model
                     
-                    # Check if updating existing or adding new
-                    existing_idx = next((i for i, e in enumerate(st.session_state.events) if e['id'] == updated_event['id']), None)
-                    if existing_idx is not None:
-                        st.session_state.events[existing_idx] = updated_event
-                    else:
-                        st.session_state.events.append(updated_event)
-                    
-                    st.session_state.editing_event = None
-                    st.session_state.has_unsaved = True
+                    # Checked against edits since the editor opened, so a newer save of this event isn't overwritten
+                    commit({"op": "upsert_event", "event": updated_event}, base_version=st.session_state.editing_base)
+                    stop_editing()
+                    # Names and costs show up in the day columns too
                     st.rerun()
             
             with col_cancel:
-                if st.form_submit_button("❌ Cancel", use_container_width=True):
-                    st.session_state.editing_event = None
-                    st.rerun()
-    
-    st.markdown("---")
-    
-    # Display events
-    for event in st.session_state.events:
-        with st.container():
-            st.markdown(f"**{event['name']}**")
-            
-            # Category badge
-            category_class = f"category-{event.get('category', 'other')}"
-            st.markdown(f'<span class="category-badge {category_class}">{CATEGORIES.get(event.get("category", "other"), "Other")}</span>', unsafe_allow_html=True)
-            
-            # Duration
-            if event.get('duration'):
-                st.caption(f"⏱️ {event['duration']}")
-            
-            # Cost
-            cost = calculate_event_cost(event, st.session_state.attendees)
-            per_person_text = f"HK{event['perPersonCost']:,.0f}/person" if event.get('perPersonCost', 0) > 0 else ""
-            min_text = f"Min: HK${event['minimumCost']:,.0f}" if event.get('minimumCost', 0) > 0 else ""
-            
-            if per_person_text and min_text:
-                st.caption(f"💰 {per_person_text} {min_text}")
-            elif per_person_text:
-                st.caption(f"💰 {per_person_text}")
-            elif min_text:
-                st.caption(f"💰 {min_text}")
-            
-            # Buttons
-            col_edit, col_delete = st.columns(2)
-            with col_edit:
-                if st.button("✏️", key=f"edit_{event['id']}", use_container_width=True):
-                    st.session_state.editing_event = event
-                    st.rerun()
-            with col_delete:
-                if st.button("🗑️", key=f"del_{event['id']}", use_container_width=True):
-                    st.session_state.events = [e for e in st.session_state.events if e['id'] != event['id']]
-                    # Remove from schedule too
-                    for day_id in st.session_state.schedule:
-                        st.session_state.schedule[day_id] = [e for e in st.session_state.schedule[day_id] if e['id'] != event['id']]
-                    st.session_state.has_unsaved = True
-                    st.rerun()
-            
-            st.markdown("---")
-    
-    # Export button
-    if st.button("📤 Export Schedule CSV", use_container_width=True):
-        rows = []
-        for day in st.session_state.days:
-            if day['id'] in st.session_state.schedule:
-                for event in st.session_state.schedule[day['id']]:
-                    cost = calculate_event_cost(event, st.session_state.attendees)
-                    rows.append({
-                        'Day': day['label'],
-                        'Event': event['name'],
-                        'Duration': event.get('duration', ''),
-                        'Category': CATEGORIES.get(event.get('category', 'other'), 'Other'),
-                        'Cost': cost
-                    })
+                # Closing the editor only reruns the editor fragment
+                st.form_submit_button("❌ Cancel", on_click=stop_editing, width="stretch")
+
+@st.fragment
+def library_panel():
+    with timed("library"):
+        st.subheader("📋 Event Library")
+        
+        # Add new event button
+        if st.button("➕ Add New Event", width="stretch"):
+            st.session_state.editing_event = {
+                "id": None,
+                "name": "",
+                "description": "",
+                "duration": "",
+                "perPersonCost": 0,
+                "minimumCost": 0,
+                "category": "other"
+            }
+            st.session_state.editing_base = None
+        
+        # Event editor (if editing)
+        event_editor()
+
+        # Vendors shared by every plan in the workspace, copied in one at a time
+        if get_workspace():
+            catalog_picker()
+
+        # Quote sheets: every row checked up front, then saved as one change
+        import_panel()
+        
+        st.markdown("---")
+        
+        # Search and filters (query the index; only one page of cards is drawn)
+        query = st.text_input("🔍 Search library", key="library_query", on_change=turn_library_page, args=(None,))
+        col_cat, col_min, col_max = st.columns([2, 1, 1])
+        with col_cat:
+            category = st.selectbox(
+                "Category",
+                [None, *CATEGORIES],
+                format_func=lambda c: "All categories" if c is None else CATEGORIES[c],
+                key="library_category",
+                on_change=turn_library_page,
+                args=(None,)
+            )
+        with col_min:
+            min_cost = st.number_input("Min cost", min_value=0.0, step=1000.0, key="library_min_cost",
+                                       on_change=turn_library_page, args=(None,))
+        with col_max:
+            max_cost = st.number_input("Max cost", min_value=0.0, step=1000.0, key="library_max_cost",
+                                       help="0 = no limit", on_change=turn_library_page, args=(None,))
+        cost_range = None
+        if min_cost or max_cost:
+            cost_range = (min_cost, max_cost or float("inf"))
+        matches = st.session_state.library.search(query, category, cost_range, st.session_state.budget.costs)
         
-        if rows:
-            df = pd.DataFrame(rows)
-            csv = df.to_csv(index=False)
+        pages = max(1, -(-len(matches) // LIBRARY_PAGE_SIZE))
+        page = min(st.session_state.library_page, pages - 1)
+        st.caption(f"{len(matches)} of {len(st.session_state.events)} events")
+        
+        # Display events
+        for event_id in matches[page * LIBRARY_PAGE_SIZE:(page + 1) * LIBRARY_PAGE_SIZE]:
+            event = st.session_state.events[event_id]
+            with st.container():
+                st.markdown(f"**{event['name']}**")
+                
+                # Category badge
+                category_class = f"category-{event.get('category', 'other')}"
+                st.markdown(f'<span class="category-badge {category_class}">{CATEGORIES.get(event.get("category", "other"), "Other")}</span>', unsafe_allow_html=True)
+                
+                # Duration
+                if event.get('duration'):
+                    st.caption(f"⏱️ {event['duration']}")
+                
+                # Cost, in the currency it was quoted in
+                quote_currency = event.get('currency', 'HKD')
+                per_person_text = f"{format_currency(event['perPersonCost'], quote_currency)}/person" if event.get('perPersonCost', 0) > 0 else ""
+                min_text = f"Min: {format_currency(event['minimumCost'], quote_currency)}" if event.get('minimumCost', 0) > 0 else ""
+                
+                if per_person_text and min_text:
+                    st.caption(f"💰 {per_person_text} {min_text}")
+                elif per_person_text:
+                    st.caption(f"💰 {per_person_text}")
+                elif min_text:
+                    st.caption(f"💰 {min_text}")
+                if 'pricing' in event or quote_currency != 'HKD':
+                    st.caption(f"📐 {describe_pricing(event)}")
+                
+                # Buttons
+                col_edit, col_delete, *col_catalog = st.columns(3 if get_workspace() else 2)
+                for col in col_catalog:
+                    with col:
+                        st.button("📚", key=f"catalog_save_{event['id']}", on_click=save_to_catalog, args=(event['id'],),
+                                  help="Save to the shared vendor catalog", width="stretch")
+                with col_edit:
+                    st.button("✏️", key=f"edit_{event['id']}", on_click=start_editing, args=(event['id'],), width="stretch")
+                with col_delete:
+                    if st.button("🗑️", key=f"del_{event['id']}", width="stretch"):
+                        # Removes it from the schedule too, so every day needs redrawing
+                        commit({"op": "delete_event", "event_id": event['id'], "days": [
+                            day_id for day_id, event_ids in st.session_state.schedule.items() if event['id'] in event_ids
+                        ]})
+                        st.rerun()
+                
+                st.markdown("---")
+        
+        # Pager
+        if pages > 1:
+            col_prev, col_page, col_next = st.columns([1, 2, 1])
+            with col_prev:
+                st.button("◀", key="library_prev", disabled=page == 0, on_click=turn_library_page, args=(page - 1,))
+            with col_page:
+                st.caption(f"Page {page + 1} of {pages}")
+            with col_next:
+                st.button("▶", key="library_next", disabled=page == pages - 1, on_click=turn_library_page, args=(page + 1,))
+        
+        # Export: built on click, off the script thread, and cached per plan version
+        col_format, col_download = st.columns([1, 2])
+        with col_format:
+            export_format = st.selectbox("Format", list(FORMATS), key="export_format", label_visibility="collapsed")
+        with col_download:
+            extension, mime = FORMATS[export_format]
+            plan = {key: st.session_state[key] for key in ("days", "schedule", "events")}
+            costs = st.session_state.budget.costs
+            version = st.session_state.version
+            path = get_store().path
             st.download_button(
-                "⬇️ Download CSV",
-                csv,
-                f"{st.session_state.eventTitle.replace(' ', '-').lower()}-schedule.csv",
-                "text/csv",
-                use_container_width=True
+                "📤 Export Schedule",
+                lambda: export_file(path, version, export_format, plan, costs),
+                f"{st.session_state.eventTitle.replace(' ', '-').lower()}-schedule.{extension}",
+                mime,
+                width="stretch"
             )
 
-with right_col:
+def catalog_picker():
+    catalog, index = get_catalog(get_workspace().catalog_mtime())
+    with st.expander(f"🏪 Vendor catalog ({len(catalog)})"):
+        query = st.text_input("Search catalog", key="catalog_query")
+        for catalog_id in index.search(query, limit=PICKER_LIMIT):
+            event = catalog[catalog_id]
+            col_name, col_add = st.columns([4, 1])
+            with col_name:
+                st.markdown(f"**{event['name']}**")
+                quote_currency = event.get('currency', 'HKD')
+                st.caption(f"💰 {format_currency(event.get('perPersonCost', 0), quote_currency)}/person · "
+                           f"Min: {format_currency(event.get('minimumCost', 0), quote_currency)}")
+                if not has_rate(event):
+                    st.caption(f"📐 {describe_pricing(event)}")
+            with col_add:
+                st.button("➕", key=f"catalog_add_{catalog_id}", on_click=add_from_catalog, args=(catalog_id,),
+                          help="Copy into this plan's library", width="stretch")
+
+def import_panel():
+    with st.expander("📥 Import quotes (CSV/Excel)"):
+        uploaded = st.file_uploader("Quote sheet", type=["csv", "xlsx"], key=f"import_file_{st.session_state.import_round}")
+        if uploaded is None:
+            st.caption("Columns are matched by header: name/event, venue, per person, minimum, category, duration, description.")
+            return
+        # Parsed once per file and plan version, not on every library rerun (search, paging, edits)
+        key = (uploaded.file_id, st.session_state.version)
+        cached = st.session_state.get("import_preview")
+        if cached is None or cached[0] != key:
+            uploaded.seek(0)
+            try:
+                preview = plan_import(iter_table(uploaded, uploaded.name), st.session_state.events,
+                                      st.session_state.nextEventId)
+            except ValueError as e:
+                preview = f"Couldn't read {uploaded.name}: {e}"
+            cached = st.session_state.import_preview = (key, preview)
+        result = cached[1]
+        if isinstance(result, str):
+            st.error(result)
+            return
+        st.caption(f"{result['added']} new · {result['updated']} updated · {result['unchanged']} unchanged · "
+                   f"{len(result['errors'])} rows skipped")
+        if result["superseded"]:
+            st.caption("Listed again further down, so the later row is used: " + ", ".join(
+                f"row {number} (by row {later})" for number, later in result["superseded"]))
+        if result["errors"]:
+            import pandas as pd
+            st.dataframe(pd.DataFrame(result["errors"], columns=["Row", "Problem"]), hide_index=True, width="stretch")
+        st.button(f"Import {len(result['changes'])} events", key="import_quotes", type="primary",
+                  disabled=not result["changes"], on_click=import_quotes, args=(result["changes"], uploaded.name),
+                  width="stretch")
+
+def import_quotes(changes, filename):
+    commit(*changes, label=f"Import {filename}")
+    # A fresh uploader, so the sheet isn't offered for import twice
+    st.session_state.import_round += 1
+    st.session_state.pop("import_preview", None)
+    # New events show up in every day's "Add event" picker too
+    st.rerun()
+
+def add_from_catalog(catalog_id):
+    catalog, _ = get_catalog(get_workspace().catalog_mtime())
+    commit({"op": "upsert_event", "event": {**catalog[catalog_id], "id": st.session_state.nextEventId}})
+    # Every day's "Add event" picker offers it too
+    st.rerun()
+
+def save_to_catalog(event_id):
+    get_workspace().add_to_catalog(st.session_state.events[event_id])
+
+# Callbacks for the day columns and library. They run before the rerun, so a
+# change only redraws the fragments it touches (see rerun_parts).
+def move_scheduled(day_id, index, to):
+    commit({"op": "schedule_move", "day_id": day_id, "index": index, "to": to})
+    rerun_parts(f"day_{day_id}")
+
+def remove_scheduled(day_id, index):
+    commit({"op": "schedule_remove", "day_id": day_id, "index": index})
+    rerun_parts(f"day_{day_id}")
+
+def add_scheduled(day_id):
+    picker = f"add_to_{day_id}"
+    if st.session_state[picker] is None:
+        return
+    commit({"op": "schedule_add", "day_id": day_id, "event_id": st.session_state[picker]})
+    # Reset the picker for the next add
+    st.session_state[picker] = None
+    st.session_state[f"find_{day_id}"] = ""
+    rerun_parts(f"day_{day_id}")
+
+def turn_library_page(page):
+    """Go to a library page; None (a new search or filter) goes back to the first"""
+    st.session_state.library_page = page or 0
+
+def start_editing(event_id):
+    st.session_state.editing_event = dict(st.session_state.events[event_id])
+    st.session_state.editing_base = st.session_state.version
+
+def stop_editing():
+    st.session_state.editing_event = None
+    st.session_state.editing_base = None
+
+def follow_editing_base(records, version):
+    """Move the editor's base version along with the session, until another session changes the event being edited
+
+    From then on the base stays behind, so saving the editor conflicts
+    instead of overwriting their change with the copy the form was opened on.
+    """
+    if st.session_state.editing_base is None or st.session_state.editing_base != st.session_state.version:
+        return
+    key = ("event", st.session_state.editing_event['id'])
+    if not any(key in touched_keys(change) for change in records):
+        st.session_state.editing_base = version
+
+def day_panel(day):
+    with timed("day"):
+        budget = st.session_state.budget
+        # Day header
+        col_title, col_remove = st.columns([4, 1])
+        with col_title:
+            st.markdown(f"**{day['label']}**")
+        with col_remove:
+            if len(st.session_state.days) > 1 and st.button("✕", key=f"remove_day_{day['id']}", help="Remove day"):
+                commit({"op": "remove_day", "day_id": day['id']})
+                # The grid reflows, so redraw the whole page
+                st.rerun()
+        
+        if day.get('notes'):
+            st.caption(f"📝 {day['notes']}")
+        
+        # Day total
+        if day['id'] in st.session_state.schedule and st.session_state.schedule[day['id']]:
+            day_total = budget.day_totals[day['id']]
+            st.caption(f"💰 {format_currency(convert(day_total, st.session_state.currency), st.session_state.currency)}")
+        
+        st.markdown("---")
+        
+        # Show scheduled events
+        if day['id'] in st.session_state.schedule:
+            for idx, event_id in enumerate(st.session_state.schedule[day['id']]):
+                event = st.session_state.events[event_id]
+                st.markdown(f"**{event['name']}**")
+                if event.get('duration'):
+                    st.caption(f"⏱️ {event['duration']}")
+                cost = budget.costs[event_id]
+                st.caption(f"💰 {format_currency(convert(cost, st.session_state.currency), st.session_state.currency)}")
+                
+                # Move and remove buttons
+                col_up, col_down, col_rem = st.columns(3)
+                with col_up:
+                    if idx > 0:
+                        st.button("⬆️", key=f"up_{day['id']}_{idx}", help="Move up",
+                                  on_click=move_scheduled, args=(day['id'], idx, idx - 1))
+                with col_down:
+                    if idx < len(st.session_state.schedule[day['id']]) - 1:
+                        st.button("⬇️", key=f"down_{day['id']}_{idx}", help="Move down",
+                                  on_click=move_scheduled, args=(day['id'], idx, idx + 1))
+                with col_rem:
+                    st.button("❌", key=f"rem_{day['id']}_{idx}", help="Remove from day",
+                              on_click=remove_scheduled, args=(day['id'], idx))
+                st.markdown("---")
+        
+        # Add event to this day: type-ahead over the library index
+        if day['id'] in st.session_state.schedule:
+            events = st.session_state.events
+            if events:
+                query = st.text_input(
+                    "Find event",
+                    key=f"find_{day['id']}",
+                    placeholder="🔍 Find an event to add",
+                    label_visibility="collapsed"
+                )
+                matches = st.session_state.library.search(query, limit=PICKER_LIMIT)
+                # Options are event IDs so events sharing a name stay distinct
+                st.selectbox(
+                    "Add event",
+                    [None, *matches],
+                    format_func=lambda event_id: "Select..." if event_id is None else events[event_id]['name'],
+                    key=f"add_to_{day['id']}",
+                    on_change=add_scheduled,
+                    args=(day['id'],),
+                    label_visibility="collapsed"
+                )
+
+# Initialize; the profiler starts first so loading the plan (pricing every event) is counted
+start_profiling()
+with timed("load"):
+    init_session_state()
+with timed("sync"):
+    sync_plan()
+
+with timed("css"):
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
+with timed("plans"):
+    workspace_sidebar()
+
+with timed("header"):
+    # Header
+    st.title("🎯 Event & Travel Budget Planner")
+
+    # Top row - Event info
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        event_title = st.text_input("Event/Trip Name", st.session_state.eventTitle)
+        if event_title != st.session_state.eventTitle:
+            commit({"op": "set", "field": "eventTitle", "value": event_title})
+        event_description = st.text_area("Description", st.session_state.eventDescription, height=100)
+        if event_description != st.session_state.eventDescription:
+            commit({"op": "set", "field": "eventDescription", "value": event_description})
+
+    with col2:
+        st.write("Attendees")
+        col_minus, col_num, col_plus = st.columns([1, 2, 1])
+        with col_minus:
+            if st.button("➖"):
+                if st.session_state.attendees > 1:
+                    commit({"op": "set", "field": "attendees", "value": st.session_state.attendees - 1})
+                    st.rerun()
+        with col_num:
+            st.markdown(f"<h2 style='text-align: center; margin: 0;'>{st.session_state.attendees}</h2>", unsafe_allow_html=True)
+        with col_plus:
+            if st.button("➕"):
+                commit({"op": "set", "field": "attendees", "value": st.session_state.attendees + 1})
+                st.rerun()
+        
+        # Currency toggle: one button per currency in the exchange-rate table (pricing.FX_RATES)
+        for col, code in zip(st.columns(len(FX_RATES)), FX_RATES):
+            with col:
+                if st.button(code, type="primary" if st.session_state.currency == code else "secondary", width="stretch"):
+                    st.session_state.currency = code
+                    note_interaction("currency")
+                    st.rerun()
+
+        # Undo / redo
+        history = st.session_state.history
+        col_undo, col_redo = st.columns(2)
+        with col_undo:
+            st.button("↩️ Undo", on_click=travel_to, args=(history.position - 1,), disabled=not history.undo_stack,
+                      help=f"Undo: {history.undo_stack[-1]['label']}" if history.undo_stack else None,
+                      width="stretch")
+        with col_redo:
+            st.button("↪️ Redo", on_click=travel_to, args=(history.position + 1,), disabled=not history.redo_stack,
+                      help=f"Redo: {history.redo_stack[-1]['label']}" if history.redo_stack else None,
+                      width="stretch")
+
+# Budget summary cards
+summary_panel()
+
+# Attendee sweep: whole cost curve in one vectorized call instead of clicking ➖/➕
+sweep_panel()
+
+# Cheapest itinerary: swap scheduled items for cheaper alternatives (other venues for the same slot)
+itinerary_panel()
+
+# Budget risk: P50/P90/P99 totals from uncertain prices and headcount
+risk_panel()
+
+# Undo history: jump back to any earlier step and see how the budget got here
+history_panel()
+
+st.markdown("---")
+
+# Main content - Two columns
+left_col, right_col = st.columns([1, 2])
+
+with left_col:
+    library_panel()
+
+with right_col, timed("days"):
     st.subheader(f"📅 Schedule ({len(st.session_state.days)} Days)")
     
     # Add day button
     if st.button("➕ Add Day"):
-        new_day_id = f"day{st.session_state.nextDayId}"
-        st.session_state.days.append({
-            "id": new_day_id,
+        commit({"op": "add_day", "day": {
+            "id": f"day{st.session_state.nextDayId}",
             "label": f"Day {st.session_state.nextDayId}",
             "notes": ""
-        })
-        st.session_state.schedule[new_day_id] = []
-        st.session_state.nextDayId += 1
-        st.session_state.has_unsaved = True
+        }})
         st.rerun()
     
     # Display days in grid
@@ -390,74 +1117,14 @@ with right_col:
             if i + j < num_days:
                 day = st.session_state.days[i + j]
                 with col:
-                    # Day header
-                    col_title, col_remove = st.columns([4, 1])
-                    with col_title:
-                        st.markdown(f"**{day['label']}**")
-                    with col_remove:
-                        if len(st.session_state.days) > 1 and st.button("✕", key=f"remove_day_{day['id']}", help="Remove day"):
-                            st.session_state.days = [d for d in st.session_state.days if d['id'] != day['id']]
-                            if day['id'] in st.session_state.schedule:
-                                del st.session_state.schedule[day['id']]
-                            st.session_state.has_unsaved = True
-                            st.rerun()
-                    
-                    if day.get('notes'):
-                        st.caption(f"📝 {day['notes']}")
-                    
-                    # Calculate day total
-                    if day['id'] in st.session_state.schedule and st.session_state.schedule[day['id']]:
-                        day_total = sum(calculate_event_cost(e, st.session_state.attendees) for e in st.session_state.schedule[day['id']])
-                        st.caption(f"💰 {format_currency(day_total, st.session_state.currency)}")
-                    
-                    st.markdown("---")
-                    
-                    # Show scheduled events
-                    if day['id'] in st.session_state.schedule:
-                        for idx, event in enumerate(st.session_state.schedule[day['id']]):
-                            st.markdown(f"**{event['name']}**")
-                            if event.get('duration'):
-                                st.caption(f"⏱️ {event['duration']}")
-                            cost = calculate_event_cost(event, st.session_state.attendees)
-                            st.caption(f"💰 {format_currency(cost, st.session_state.currency)}")
-                            
-                            # Move and remove buttons
-                            col_up, col_down, col_rem = st.columns(3)
-                            with col_up:
-                                if idx > 0 and st.button("⬆️", key=f"up_{day['id']}_{idx}", help="Move up"):
-                                    st.session_state.schedule[day['id']][idx], st.session_state.schedule[day['id']][idx-1] = \
-                                        st.session_state.schedule[day['id']][idx-1], st.session_state.schedule[day['id']][idx]
-                                    st.session_state.has_unsaved = True
-                                    st.rerun()
-                            with col_down:
-                                if idx < len(st.session_state.schedule[day['id']]) - 1 and st.button("⬇️", key=f"down_{day['id']}_{idx}", help="Move down"):
-                                    st.session_state.schedule[day['id']][idx], st.session_state.schedule[day['id']][idx+1] = \
-                                        st.session_state.schedule[day['id']][idx+1], st.session_state.schedule[day['id']][idx]
-                                    st.session_state.has_unsaved = True
-                                    st.rerun()
-                            with col_rem:
-                                if st.button("❌", key=f"rem_{day['id']}_{idx}", help="Remove from day"):
-                                    st.session_state.schedule[day['id']].pop(idx)
-                                    st.session_state.has_unsaved = True
-                                    st.rerun()
-                            st.markdown("---")
-                    
-                    # Add event to this day (dropdown selector)
-                    if day['id'] in st.session_state.schedule:
-                        available_events = [e for e in st.session_state.events]
-                        if available_events:
-                            event_names = ["Select..."] + [e['name'] for e in available_events]
-                            selected = st.selectbox(
-                                "Add event",
-                                event_names,
-                                key=f"add_to_{day['id']}",
-                                label_visibility="collapsed"
-                            )
-                            if selected != "Select...":
-                                event_to_add = next(e for e in available_events if e['name'] == selected)
-                                st.session_state.schedule[day['id']].append(event_to_add)
-                                st.session_state.has_unsaved = True
-                                st.rerun()
+                    # Each day is its own fragment so edits in one column only redraw that column
+                    st.fragment(day_panel, key=f"day_{day['id']}")(day)
 
 st.markdown("---")
-st.caption(f"💾 Data automatically saved to {DATA_FILE} | Share this app URL with your team for collaboration!")
+st.caption(f"💾 Data automatically saved to {get_store().path} | Share this app URL with your team for collaboration!")
+st.session_state.latency["app"] = (time.perf_counter() - run_started) * 1000
+if st.session_state.get("profiler"):
+    st.session_state.profiler.finish("full", st.session_state.latency["app"])
+latency_panel()
+profile_panel()
+sync_poller()
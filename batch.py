@@ -0,0 +1,68 @@
+"""Budget a directory of plan files from the command line, without Streamlit.
+
+Plans are priced in a process pool and each result is printed as one JSON
+line as soon as that plan finishes, so output can be piped into other tools
+while the rest of the batch is still running.
+
+    python batch.py plans/ --export-dir exports/ --format Parquet
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+
+from budget import BudgetAggregator
+from core import plan_summary, read_plan
+from export import FORMATS, WRITERS, export_rows
+
+
+def budget_plan(path, export_dir=None, fmt="CSV"):
+    """Summarize one plan file, optionally exporting its schedule; runs in a worker process"""
+    plan = read_plan(path)
+    budget = BudgetAggregator(plan["events"], plan["schedule"], plan["attendees"])
+    result = {"file": path, **plan_summary(plan, budget)}
+    if export_dir:
+        name = os.path.splitext(os.path.basename(path))[0]
+        export_path = os.path.join(export_dir, f"{name}-schedule.{FORMATS[fmt][0]}")
+        # Streamed straight to disk, chunk by chunk
+        with open(export_path, "wb") as f:
+            WRITERS[fmt](export_rows(plan, budget.costs), f)
+        result["export"] = export_path
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Budget every plan JSON file in a directory")
+    parser.add_argument("directory")
+    parser.add_argument("--pattern", default="*.json", help="file name pattern (default: *.json)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--export-dir", help="also export each plan's schedule as <name>-schedule.<ext> here")
+    parser.add_argument("--format", choices=list(FORMATS), default="CSV", help="export format (default: CSV)")
+    args = parser.parse_args(argv)
+
+    paths = sorted(glob(os.path.join(args.directory, args.pattern)))
+    if args.export_dir:
+        os.makedirs(args.export_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(budget_plan, path, args.export_dir, args.format): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                result = {"file": futures[future], "error": f"{type(e).__name__}: {e}"}
+            print(json.dumps(result), flush=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(paths)} plans ({failed} failed) in {elapsed:.2f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
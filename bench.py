@@ -0,0 +1,295 @@
+"""Performance benchmarks for the planner on synthetic plans of growing size.
+
+Measures cost/budget throughput, export time and peak memory, rerun
+latency of typical clicks through Streamlit's headless AppTest harness, and
+time to first render in a fresh interpreter (a cold start).
+Results are written as JSON so a later run can be compared against them:
+
+    python bench.py --save bench_baseline.json
+    python bench.py --compare bench_baseline.json      # exits 1 on regressions
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from budget import BudgetAggregator, calculate_event_cost
+from core import CATEGORIES
+from export import export_bytes
+from storage import PlanStore, events_from_list
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# name -> (library events, days, items per day)
+SCALES = {
+    "small": (10, 4, 5),
+    "medium": (1_000, 20, 10),
+    "large": (10_000, 60, 20),
+}
+
+VENUES = ["Murray", "Hyatt Regency", "W Hotel", "The Verandah", "WaterMark", "Crown Wine Cellar"]
+ACTIVITIES = ["Welcome Reception", "Gala Dinner", "Conference Hall Rental", "Lunch", "Workshop Session", "Tour Bus"]
+
+
+def synthetic_plan(events=100, days=4, items_per_day=6, seed=0):
+    """A random plan in the app's schema; event names follow the "<activity> in <venue>" pattern"""
+    rng = random.Random(seed)
+    library = []
+    for event_id in range(1, events + 1):
+        per_person = rng.choice([0, rng.randrange(100, 2000)])
+        library.append({
+            "id": event_id,
+            "name": f"{rng.choice(ACTIVITIES)} {event_id % 50} in {rng.choice(VENUES)}",
+            "description": "",
+            "duration": rng.choice(["", "Lunch", "Dinner", "Half Day", "3 hours"]),
+            "perPersonCost": per_person,
+            "minimumCost": rng.choice([0, rng.randrange(5_000, 300_000)]) if per_person else rng.randrange(5_000, 300_000),
+            "category": rng.choice(list(CATEGORIES)),
+        })
+    day_list = [{"id": f"day{n}", "label": f"Day {n}", "notes": ""} for n in range(1, days + 1)]
+    return {
+        "eventTitle": f"Synthetic {events}x{days}x{items_per_day}",
+        "eventDescription": "",
+        "attendees": 100,
+        "nextEventId": events + 1,
+        "nextDayId": days + 1,
+        "events": events_from_list(library),
+        "days": day_list,
+        "schedule": {day["id"]: [rng.randrange(1, events + 1) for _ in range(items_per_day)] for day in day_list},
+        "attendeeUncertainty": None,
+    }
+
+
+def timed_ms(fn, repeat=5):
+    """(best, median) wall time of fn() in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times), statistics.median(times)
+
+
+def peak_kib(fn):
+    """Peak traced allocation while fn() runs, in KiB"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_core(plan):
+    events, schedule, attendees = plan["events"], plan["schedule"], plan["attendees"]
+    results = {}
+
+    library = list(events.values())
+    evaluations = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < 0.2:
+        for event in library:
+            calculate_event_cost(event, attendees)
+        evaluations += len(library)
+    results["cost_evals_per_s"] = evaluations / (time.perf_counter() - started)
+
+    # The original get_total_budget(): re-price every scheduled item
+    def resum():
+        return sum(calculate_event_cost(events[event_id], attendees)
+                   for event_ids in schedule.values() for event_id in event_ids)
+    # Best of several runs: sub-millisecond timings are mostly scheduler noise otherwise
+    results["budget_resum_ms"] = timed_ms(resum, repeat=20)[0]
+    results["budget_rebuild_ms"] = timed_ms(lambda: BudgetAggregator(events, schedule, attendees), repeat=20)[0]
+
+    budget = BudgetAggregator(events, schedule, attendees)
+    day_id = plan["days"][0]["id"]
+    add = {"op": "schedule_add", "day_id": day_id, "event_id": next(iter(events))}
+    remove = {"op": "schedule_remove", "day_id": day_id, "index": len(schedule[day_id])}
+
+    def observe_pair():
+        # Totals only; the plan itself is left as it was
+        budget.observe(plan, add)
+        schedule[day_id].append(add["event_id"])
+        budget.observe(plan, remove)
+        schedule[day_id].pop()
+    results["budget_observe_ms"] = timed_ms(observe_pair, repeat=50)[0] / 2
+
+    costs = budget.costs
+    results["export_csv_ms"] = timed_ms(lambda: export_bytes(plan, costs, "CSV"), repeat=3)[0]
+    results["export_csv_peak_kib"] = peak_kib(lambda: export_bytes(plan, costs, "CSV"))
+    results["export_xlsx_ms"] = timed_ms(lambda: export_bytes(plan, costs, "Excel"), repeat=3)[0]
+    return results
+
+
+def bench_ui(plan, repeat=5):
+    """Rerun latency of typical clicks, with the plan saved as plan_data.json in a scratch directory"""
+    # Imported here so core benchmarks run without Streamlit
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="planner-bench-")
+    os.chdir(workdir)
+    try:
+        PlanStore("plan_data.json").save(plan)
+        # The store and caches are process-wide; don't let another scale's plan leak in
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        started = time.perf_counter()
+        at.run()
+        results["ui_first_run_ms"] = (time.perf_counter() - started) * 1000
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+        day_id = plan["days"][0]["id"]
+
+        def button(key=None, label=None):
+            return next(b for b in at.button if (key and b.key == key) or (label and b.label == label))
+
+        interactions = {
+            "reorder": lambda: button(key=f"down_{day_id}_0").click().run(),
+            "add_event": lambda: next(s for s in at.selectbox if s.key == f"add_to_{day_id}").set_value(
+                next(iter(plan["events"]))).run(),
+            "attendees_plus": lambda: button(label="➕").click().run(),
+            "attendees_minus": lambda: button(label="➖").click().run(),
+            "currency_usd": lambda: button(label="USD").click().run(),
+            "currency_hkd": lambda: button(label="HKD").click().run(),
+        }
+        for name, interact in interactions.items():
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                interact()
+                times.append((time.perf_counter() - started) * 1000)
+                if at.exception:
+                    raise RuntimeError(at.exception[0].message)
+                # Fragment reruns leave AppTest with a partial tree; redraw (untimed) so every widget can be found again
+                at.run()
+            results[f"ui_{name}_ms"] = statistics.median(times)
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+# Runs in a fresh interpreter, so nothing is imported or cached yet, as after the app has slept
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+loaded = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=600)
+at.run()
+done = time.perf_counter()
+print(json.dumps({
+    "harness_ms": (loaded - started) * 1000,
+    "first_run_ms": (done - loaded) * 1000,
+    "heavy": [name for name in ("pandas", "numpy", "pyarrow") if name in sys.modules],
+    "error": at.exception[0].message if at.exception else None,
+}))
+"""
+
+
+def bench_startup(plan, repeat=3):
+    """Time to first render of a new session in a new server process, plan saved as plan_data.json"""
+    workdir = tempfile.mkdtemp(prefix="planner-startup-")
+    PlanStore(os.path.join(workdir, "plan_data.json")).save(plan)
+    first_runs, totals = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, APP_PATH], cwd=workdir,
+                             capture_output=True, text=True, check=True).stdout
+        totals.append((time.perf_counter() - started) * 1000)
+        report = json.loads(out.strip().splitlines()[-1])
+        if report["error"]:
+            raise RuntimeError(report["error"])
+        first_runs.append(report["first_run_ms"])
+    print(f"  first render imported: {', '.join(report['heavy']) or 'none of pandas/numpy/pyarrow'}", file=sys.stderr)
+    return {
+        "startup_first_run_ms": statistics.median(first_runs),
+        "startup_process_ms": statistics.median(totals),
+    }
+
+
+def run(scales, ui=True, repeat=5, startup_only=False):
+    results = {}
+    for name in scales:
+        events, days, items = SCALES[name]
+        plan = synthetic_plan(events, days, items)
+        print(f"{name}: {events} events, {days} days x {items} items", file=sys.stderr)
+        if startup_only:
+            results[name] = bench_startup(plan)
+            continue
+        results[name] = bench_core(plan)
+        if ui:
+            results[name].update(bench_startup(plan))
+            results[name].update(bench_ui(plan, repeat))
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scales": {name: SCALES[name] for name in scales},
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance, floor_ms=1.0):
+    """Print each metric against the baseline; return the ones that got worse by more than tolerance
+
+    Timings under ``floor_ms`` in both runs are too small to call either way.
+    """
+    regressions = []
+    for scale, metrics in current["results"].items():
+        for metric, value in metrics.items():
+            before = baseline["results"].get(scale, {}).get(metric)
+            if not before:
+                continue
+            change = value / before - 1
+            # Throughputs should go up; times and memory should go down
+            worse = -change if metric.endswith("_per_s") else change
+            noise = metric.endswith("_ms") and max(value, before) < floor_ms
+            flag = "REGRESSION" if worse > tolerance and not noise else ""
+            print(f"{scale:8} {metric:26} {before:14.2f} -> {value:14.2f} {change:+8.1%} {flag}")
+            if flag:
+                regressions.append((scale, metric, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the planner on synthetic plans")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=list(SCALES))
+    parser.add_argument("--no-ui", action="store_true", help="skip the AppTest rerun benchmarks")
+    parser.add_argument("--startup-only", action="store_true", help="only time the first render in a fresh process")
+    parser.add_argument("--repeat", type=int, default=5, help="clicks timed per interaction (median reported)")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare against a JSON file saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging (default 25%%)")
+    args = parser.parse_args(argv)
+
+    current = run(args.scales, ui=not args.no_ui, repeat=args.repeat, startup_only=args.startup_only)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+        return 1 if regressions else 0
+    print(json.dumps(current["results"], indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Budget totals for the planner, kept up to date by deltas instead of re-summing every rerun."""
+from collections import Counter, defaultdict
+
+from pricing import event_cost
+
+
+def calculate_event_cost(event, attendees):
+    """Calculate event cost in HKD from the event's pricing model (see pricing.py)"""
+    return event_cost(event, attendees)
+
+
+class BudgetAggregator:
+    """Per-day, per-category and grand totals for a plan's schedule
+
+    Call observe() with each change *before* it is applied to the plan, so
+    removals can still see which event they are taking out.
+    """
+
+    def __init__(self, events, schedule, attendees):
+        self.rebuild(events, schedule, attendees)
+
+    def rebuild(self, events, schedule, attendees):
+        """Recompute everything in one pass: each library event is priced once"""
+        self.attendees = attendees
+        self.costs = {event_id: calculate_event_cost(event, attendees) for event_id, event in events.items()}
+        self.categories = {event_id: event.get('category', 'other') for event_id, event in events.items()}
+        # event id -> {day id: times scheduled that day}
+        self.placements = defaultdict(Counter)
+        self.day_totals = {}
+        self.category_totals = defaultdict(float)
+        self.total = 0
+        self.count = 0
+        for day_id, event_ids in schedule.items():
+            self.day_totals[day_id] = 0
+            for event_id in event_ids:
+                self._add(day_id, event_id)
+
+    def _add(self, day_id, event_id, times=1):
+        cost = self.costs[event_id] * times
+        self.placements[event_id][day_id] += times
+        self.day_totals[day_id] += cost
+        self.category_totals[self.categories[event_id]] += cost
+        self.total += cost
+        self.count += times
+
+    def _remove(self, day_id, event_id, times=1):
+        cost = self.costs[event_id] * times
+        placements = self.placements[event_id]
+        placements[day_id] -= times
+        if placements[day_id] <= 0:
+            del placements[day_id]
+        self.day_totals[day_id] -= cost
+        self.category_totals[self.categories[event_id]] -= cost
+        self.total -= cost
+        self.count -= times
+
+    def _reprice(self, event):
+        """Swap an event's old cost for its new one on every day it is scheduled"""
+        event_id = event['id']
+        placements = dict(self.placements.get(event_id, {}))
+        for day_id, times in placements.items():
+            self._remove(day_id, event_id, times)
+        self.costs[event_id] = calculate_event_cost(event, self.attendees)
+        self.categories[event_id] = event.get('category', 'other')
+        for day_id, times in placements.items():
+            self._add(day_id, event_id, times)
+
+    def observe(self, plan, change):
+        """Update totals for a change that is about to be applied to plan"""
+        op = change["op"]
+        if op == "set" and change["field"] == "attendees":
+            self.rebuild(plan["events"], plan["schedule"], change["value"])
+        elif op == "upsert_event":
+            self._reprice(change["event"])
+        elif op == "delete_event":
+            event_id = change["event_id"]
+            for day_id, times in list(self.placements.get(event_id, {}).items()):
+                self._remove(day_id, event_id, times)
+            self.placements.pop(event_id, None)
+            self.costs.pop(event_id, None)
+            self.categories.pop(event_id, None)
+        elif op == "add_day":
+            self.day_totals[change["day"]["id"]] = 0
+        elif op == "remove_day":
+            day_id = change["day_id"]
+            for event_id in plan["schedule"].get(day_id, []):
+                self._remove(day_id, event_id)
+            self.day_totals.pop(day_id, None)
+        elif op == "set_day":
+            day_id = change["day_id"]
+            for event_id in plan["schedule"].get(day_id, []):
+                self._remove(day_id, event_id)
+            for event_id in change["event_ids"]:
+                self._add(day_id, event_id)
+        elif op == "schedule_add":
+            self._add(change["day_id"], change["event_id"])
+        elif op == "schedule_remove":
+            day_id = change["day_id"]
+            self._remove(day_id, plan["schedule"][day_id][change["index"]])
+        # schedule_move only reorders a day, which leaves every total unchanged
@@ -0,0 +1,188 @@
+"""Planning logic that needs no UI: seed data, normalization and cost breakdowns.
+
+app.py renders these; batch.py runs them over a directory of plans without
+starting Streamlit at all.
+"""
+from functools import lru_cache
+
+# calculate_event_cost, FX_RATES and convert are re-exported so headless callers need only this module
+from budget import BudgetAggregator, calculate_event_cost
+from pricing import FX_RATES, convert
+from storage import PlanStore, events_from_list
+
+# Categories
+CATEGORIES = {
+    "venue": "Venue",
+    "food": "Food & Beverage",
+    "other": "Other"
+}
+
+CURRENCY_SYMBOLS = {"HKD": "HK$", "USD": "US$"}
+
+def format_currency(amount, currency):
+    """Format an amount that is already in ``currency`` (see pricing.convert)"""
+    if currency == "HKD":
+        return f"HK${amount:,.0f}"
+    else:
+        return f"{CURRENCY_SYMBOLS.get(currency, currency + ' ')}{amount:,.2f}"
+
+def copy_plan(plan):
+    """A copy of a plan that changes can be applied to without touching the original
+
+    Only the containers changes edit in place are copied -- the events dict,
+    the day list and each day's schedule -- so copying is cheap. Event and day
+    dicts are shared: changes replace them rather than modifying them.
+    """
+    return {
+        **plan,
+        "events": dict(plan["events"]),
+        "days": list(plan["days"]),
+        "schedule": {day_id: list(event_ids) for day_id, event_ids in plan["schedule"].items()},
+    }
+
+# IAPN data used when no plan has been saved yet
+def seed_plan():
+    return copy_plan(_seed_plan())
+
+# Built once per process; seed_plan() hands out copies
+@lru_cache(maxsize=None)
+def _seed_plan():
+    return {
+        "eventTitle": "IAPN 2027 May 21-24",
+        "eventDescription": "",
+        "attendees": 100,
+        "nextEventId": 23,
+        "nextDayId": 5,
+        
+        # All events in library, indexed by id
+        "events": events_from_list([
+            {"id": 1, "name": "Welcome Reception in Murray", "description": "", "duration": "3 hours", "perPersonCost": 1180, "minimumCost": 140000, "category": "food"},
+            {"id": 5, "name": "Welcome Reception in Hyatt Regency", "description": "", "duration": "3 hours", "perPersonCost": 818, "minimumCost": 68800, "category": "food"},
+            {"id": 6, "name": "Gala Dinner in The Verandah", "description": "", "duration": "Dinner", "perPersonCost": 1628, "minimumCost": 360000, "category": "food"},
+            {"id": 9, "name": "Gala Dinner in Crown Wine Cellar", "description": "", "duration": "Dinner", "perPersonCost": 1688, "minimumCost": 110000, "category": "food"},
+            {"id": 10, "name": "Gala Dinner in WaterMark", "description": "", "duration": "Dinner", "perPersonCost": 0, "minimumCost": 168000, "category": "food"},
+            {"id": 11, "name": "Sai Kung Seafood Dinner", "description": "", "duration": "Dinner", "perPersonCost": 1000, "minimumCost": 0, "category": "food"},
+            {"id": 12, "name": "Star Ferry", "description": "110 passengers. 3 hours 45,000", "duration": "Cocktail", "perPersonCost": 0, "minimumCost": 0, "category": "food",
+             "pricing": {"unitCost": 45000, "unitSize": 110}},
+            {"id": 15, "name": "Star Ferry Canapes/ Lunch", "description": "Canapes Room.", "duration": "Cocktail", "perPersonCost": 500, "minimumCost": 0, "category": "food"},
+            {"id": 2, "name": "Conference Hall Rental in Murray", "description": "Main venue for keynote sessions", "duration": "Half Day", "perPersonCost": 0, "minimumCost": 75000, "category": "venue"},
+            {"id": 7, "name": "Conference Hall Rental in Hyatt Regency", "description": "Main venue for keynote sessions", "duration": "Half Day", "perPersonCost": 0, "minimumCost": 40800, "category": "venue"},
+            {"id": 8, "name": "Conference Hall Rental in W Hotel", "description": "Main venue for keynote sessions", "duration": "Half Day", "perPersonCost": 0, "minimumCost": 118000, "category": "venue"},
+            {"id": 3, "name": "Workshop Session", "description": "Interactive training with materials", "duration": "4 hours", "perPersonCost": 1200, "minimumCost": 0, "category": "venue"},
+            {"id": 13, "name": "Tour Bus for Macau", "description": "2 buses, 1 bus 4500 full day estimate", "duration": "", "perPersonCost": 0, "minimumCost": 0, "category": "other",
+             "pricing": {"unitCost": 4500, "unitSize": 50},
+             "uncertainty": {"unitCost": {"dist": "triangular", "low": 4000, "high": 6500}}},
+            {"id": 14, "name": "Macau Lunch - Portugese Food", "description": "Budget 500 per person", "duration": "", "perPersonCost": 500, "minimumCost": 0, "category": "other"},
+            {"id": 16, "name": "Sai Kung Alcohol Cost", "description": "Buy Bottles and bring there.", "duration": "", "perPersonCost": 299.98, "minimumCost": 0, "category": "other",
+             "uncertainty": {"perPersonCost": {"dist": "triangular", "low": 200, "high": 450}}},
+            {"id": 17, "name": "Dragon Dance Performance", "description": "", "duration": "", "perPersonCost": 0, "minimumCost": 10000, "category": "other"},
+            {"id": 18, "name": "Dim Sum Lunch", "description": "", "duration": "Lunch", "perPersonCost": 350, "minimumCost": 0, "category": "other"},
+            {"id": 19, "name": "Korean BBQ Dinner", "description": "", "duration": "Dinner", "perPersonCost": 800, "minimumCost": 0, "category": "other"},
+            {"id": 20, "name": "Star Ferry Alcohol Cost", "description": "", "duration": "Lunch", "perPersonCost": 300, "minimumCost": 0, "category": "other"},
+            {"id": 21, "name": "Murray Lunch", "description": "", "duration": "", "perPersonCost": 600, "minimumCost": 0, "category": "other"},
+            {"id": 22, "name": "Jocky Club Lunch- Saturday/ Sunday", "description": "Wouldnt know until the race schedule out in 2026.", "duration": "", "perPersonCost": 830, "minimumCost": 0, "category": "other",
+             "uncertainty": {"perPersonCost": {"dist": "triangular", "low": 700, "high": 1100}}}
+        ]),
+        
+        # Days
+        "days": [
+            {"id": "day1", "label": "Day 1", "notes": ""},
+            {"id": "day2", "label": "Day 2", "notes": "Murray Conference->Star Ferry Lunch->Sai Kung Seafood Dinner"},
+            {"id": "day3", "label": "Day 3", "notes": "Macau Day Trip->Lunch in Macau-> Come BackBBQ"},
+            {"id": "day4", "label": "Day 4", "notes": "Conference->Dim Sum->Gala"}
+        ],
+        
+        # Schedule (event IDs assigned to days)
+        "schedule": {
+            "day1": [1],
+            "day2": [2, 11, 16, 17, 12, 15, 20],
+            "day3": [13, 14, 19],
+            "day4": [2, 18, 6]
+        },
+
+        # Expected headcount range for the budget-risk simulation
+        "attendeeUncertainty": {"dist": "triangular", "low": 80, "high": 120}
+    }
+
+# A new workspace plan: one empty day, and a library filled from the vendor catalog as needed
+def blank_plan(title):
+    return {
+        "eventTitle": title,
+        "eventDescription": "",
+        "attendees": 100,
+        "nextEventId": 1,
+        "nextDayId": 2,
+        "events": {},
+        "days": [{"id": "day1", "label": "Day 1", "notes": ""}],
+        "schedule": {"day1": []},
+        "attendeeUncertainty": None
+    }
+
+
+def normalize_plan(plan):
+    """Fill in the shape the rest of the code expects from a hand-written or exported plan
+
+    Events may be a list or keyed by id, and schedule items may be event ids or
+    whole event dicts (as older exports had them). Days missing from ``days``
+    are added for every day in the schedule.
+    """
+    events = plan.get("events", {})
+    if isinstance(events, list):
+        events = events_from_list(events)
+    else:
+        # JSON object keys are strings
+        events = {int(event_id): event for event_id, event in events.items()}
+    schedule = {
+        day_id: [item["id"] if isinstance(item, dict) else item for item in items]
+        for day_id, items in plan.get("schedule", {}).items()
+    }
+    days = list(plan.get("days", []))
+    known = {day["id"] for day in days}
+    days += [{"id": day_id, "label": day_id, "notes": ""} for day_id in schedule if day_id not in known]
+    for day in days:
+        schedule.setdefault(day["id"], [])
+    return {
+        **plan,
+        "eventTitle": plan.get("eventTitle", ""),
+        "eventDescription": plan.get("eventDescription", ""),
+        "attendees": plan.get("attendees", 1),
+        "nextEventId": plan.get("nextEventId", max(events, default=0) + 1),
+        "nextDayId": plan.get("nextDayId", len(days) + 1),
+        "events": events,
+        "days": days,
+        "schedule": schedule,
+        "attendeeUncertainty": plan.get("attendeeUncertainty"),
+    }
+
+
+def read_plan(path):
+    """Load a plan file (with any journal next to it) for read-only use, normalized"""
+    plan, _ = PlanStore(path).read()
+    if plan is None:
+        raise FileNotFoundError(path)
+    return normalize_plan(plan)
+
+
+def plan_summary(plan, budget=None):
+    """Totals and per-day / per-category breakdowns of a normalized plan, as JSON-ready values
+
+    Pass the session's running ``budget`` to skip re-pricing the plan.
+    """
+    attendees = plan["attendees"]
+    if budget is None:
+        budget = BudgetAggregator(plan["events"], plan["schedule"], attendees)
+    return {
+        "title": plan["eventTitle"],
+        "attendees": attendees,
+        "total": budget.total,
+        "perPerson": budget.total / attendees if attendees > 0 else 0,
+        "eventsScheduled": budget.count,
+        "perDay": [
+            {"day": day["id"], "label": day["label"], "total": budget.day_totals.get(day["id"], 0)}
+            for day in plan["days"]
+        ],
+        "perCategory": {
+            label: budget.category_totals.get(category, 0) for category, label in CATEGORIES.items()
+        },
+    }
+
@@ -0,0 +1,161 @@
+"""Schedule exports (CSV, Parquet, XLSX) streamed from the plan in chunks.
+
+Rows are generated one at a time from the schedule and written out a chunk at
+a time, so an export never holds more than ``chunk_rows`` rows in memory
+beyond the file being built. Each day is followed by its subtotal, and the
+export ends with per-category subtotals and the grand total, in HKD and USD.
+"""
+import csv
+import io
+import zipfile
+from itertools import chain, islice
+from xml.sax.saxutils import escape
+
+from core import CATEGORIES
+from pricing import convert
+
+COLUMNS = ["Row", "Day", "Event", "Duration", "Category", "Cost (HKD)", "Cost (USD)"]
+CHUNK_ROWS = 1000
+
+# Download formats: label -> (file extension, MIME type)
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def _row(kind, day, event, duration, category, cost):
+    return (kind, day, event, duration, category, cost, round(convert(cost, "USD"), 2))
+
+
+def export_rows(plan, costs):
+    """Yield export rows lazily: items, a subtotal after each day, then category subtotals and the total
+
+    ``costs`` maps event id to its cost at the plan's headcount (BudgetAggregator.costs).
+    """
+    total = 0
+    by_category = dict.fromkeys(CATEGORIES, 0)
+    for day in plan["days"]:
+        day_total = 0
+        for event_id in plan["schedule"].get(day["id"], []):
+            event = plan["events"][event_id]
+            category = event.get('category', 'other')
+            cost = costs[event_id]
+            day_total += cost
+            by_category[category] = by_category.get(category, 0) + cost
+            yield _row("Item", day['label'], event['name'], event.get('duration', ''),
+                       CATEGORIES.get(category, 'Other'), cost)
+        total += day_total
+        yield _row("Day subtotal", day['label'], "", "", "", day_total)
+    for category, cost in by_category.items():
+        yield _row("Category subtotal", "", "", "", CATEGORIES.get(category, 'Other'), cost)
+    yield _row("Total", "", "", "", "", total)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def write_csv(rows, out, chunk_rows=CHUNK_ROWS):
+    """Write rows as CSV to a binary file object"""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(COLUMNS)
+    for chunk in chunked(rows, chunk_rows):
+        writer.writerows(chunk)
+    text.flush()
+    # Leave ``out`` open for the caller
+    text.detach()
+
+
+def write_parquet(rows, out, chunk_rows=CHUNK_ROWS):
+    """Write rows as Parquet, one row group per chunk; the Row column tells items from subtotals"""
+    # pyarrow comes with Streamlit but is only needed here
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [(name, pa.string()) for name in COLUMNS[:5]] + [(name, pa.float64()) for name in COLUMNS[5:]]
+    )
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in chunked(rows, chunk_rows):
+            columns = zip(*chunk)
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+
+
+# The fixed parts of a one-sheet workbook; only the sheet itself is streamed
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Schedule" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(ref, value):
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+def write_xlsx(rows, out, chunk_rows=CHUNK_ROWS):
+    """Write rows as a one-sheet XLSX workbook, streaming the sheet XML into the zip"""
+    letters = [chr(ord("A") + i) for i in range(len(COLUMNS))]
+    # Fast compression: the sheet XML is repetitive enough that level 1 gets most of the saving
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as workbook:
+        for name, xml in _XLSX_PARTS.items():
+            workbook.writestr(name, xml)
+        with workbook.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            number = 0
+            for chunk in chunked(chain([COLUMNS], rows), chunk_rows):
+                xml = []
+                for row in chunk:
+                    number += 1
+                    cells = "".join(_xlsx_cell(f"{letter}{number}", value) for letter, value in zip(letters, row))
+                    xml.append(f'<row r="{number}">{cells}</row>')
+                sheet.write("".join(xml).encode("utf-8"))
+            sheet.write(b'</sheetData></worksheet>')
+
+
+WRITERS = {"CSV": write_csv, "Parquet": write_parquet, "Excel": write_xlsx}
+
+
+def export_bytes(plan, costs, fmt, chunk_rows=CHUNK_ROWS):
+    """The whole export file for one of FORMATS"""
+    out = io.BytesIO()
+    WRITERS[fmt](export_rows(plan, costs), out, chunk_rows)
+    return out.getvalue()
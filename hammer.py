@@ -0,0 +1,191 @@
+"""Simulate many editing sessions hammering one plan file at once.
+
+Each worker process is a "session" holding its own copy of the plan, like a
+browser tab does in st.session_state. It makes random edits -- mostly on its
+own day, sometimes on a shared day, event or the headcount -- saving each with
+the version it was made against. At the end every session catches up, and all
+copies, the file on disk and the running budget totals must agree. A last
+check replays an undo that merges another session's edit.
+
+    python hammer.py --sessions 8 --edits 200
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+from multiprocessing import Barrier, Pool
+
+from budget import BudgetAggregator
+from history import History, inverse
+from storage import ConflictError, PlanStore, apply_change, events_from_list, touched_keys
+
+
+def seed(sessions, events=12):
+    """A plan with one day per session plus a shared day everyone edits"""
+    days = [{"id": "shared", "label": "Shared", "notes": ""}]
+    days += [{"id": f"day{n}", "label": f"Day {n}", "notes": ""} for n in range(1, sessions + 1)]
+    return {
+        "eventTitle": "Load test",
+        "eventDescription": "",
+        "attendees": 50,
+        "nextEventId": events + 1,
+        "nextDayId": sessions + 1,
+        "events": events_from_list([
+            {"id": i, "name": f"Event {i}", "category": "dining", "description": "",
+             "perPersonCost": 100 * i, "minimumCost": 1000 * i}
+            for i in range(1, events + 1)
+        ]),
+        "days": days,
+        "schedule": {day["id"]: [] for day in days},
+        "attendeeUncertainty": None,
+    }
+
+
+def random_change(plan, own_day, rng):
+    day_id = "shared" if rng.random() < 0.2 else own_day
+    items = plan["schedule"][day_id]
+    roll = rng.random()
+    if roll < 0.4 or not items:
+        return {"op": "schedule_add", "day_id": day_id, "event_id": rng.choice(list(plan["events"]))}
+    if roll < 0.6:
+        return {"op": "schedule_move", "day_id": day_id, "index": rng.randrange(len(items)), "to": rng.randrange(len(items))}
+    if roll < 0.8:
+        return {"op": "schedule_remove", "day_id": day_id, "index": rng.randrange(len(items))}
+    if roll < 0.9:
+        event = dict(plan["events"][rng.choice(list(plan["events"]))])
+        event["perPersonCost"] = rng.randrange(50, 1000)
+        return {"op": "upsert_event", "event": event}
+    return {"op": "set", "field": "attendees", "value": rng.randrange(10, 200)}
+
+
+def init_worker(barrier):
+    global finished
+    finished = barrier
+
+
+def session(args):
+    """One simulated editor; returns (saved, conflicts, final plan as JSON)"""
+    path, number, edits, compact_after = args
+    rng = random.Random(number)
+    store = PlanStore(path, compact_after=compact_after)
+    own_day = f"day{number}"
+
+    def reload():
+        plan, version = store.load()
+        return plan, version, BudgetAggregator(plan["events"], plan["schedule"], plan["attendees"])
+
+    def apply(change):
+        budget.observe(plan, change)
+        apply_change(plan, change)
+
+    plan, version, budget = reload()
+    saved = conflicts = 0
+    for _ in range(edits):
+        change = random_change(plan, own_day, rng)
+        try:
+            version, theirs = store.append([change], version)
+        except ConflictError:
+            conflicts += 1
+            plan, version, budget = reload()
+            continue
+        for record in theirs:
+            apply(record)
+        apply(change)
+        saved += 1
+
+    # Catch up only once every session has stopped editing
+    finished.wait()
+    records, _ = store.changes_since(version)
+    if records is None:
+        plan, version, budget = reload()
+    else:
+        for record in records:
+            apply(record)
+    reference = BudgetAggregator(plan["events"], plan["schedule"], plan["attendees"])
+    assert abs(budget.total - reference.total) < 1e-6, (number, budget.total, reference.total)
+    return saved, conflicts, json.dumps(plan, sort_keys=True)
+
+
+def check_undo_after_merge():
+    """Undo that merges another session's edit moves the right steps, and a stale op is refused
+
+    Session A adds an event to three days; B adds one to A's first day. A's
+    next undo merges B's edit, which drops A's oldest step -- the undo stack
+    must still lose exactly the step that was undone.
+    """
+    path = os.path.join(tempfile.mkdtemp(), "plan_data.json")
+    a, b = PlanStore(path), PlanStore(path)
+    plan, version = a.load(seed(3))
+    history = History()
+    days = ["day1", "day2", "day3"]
+
+    def commit(changes, record=True):
+        nonlocal version
+        version, theirs = a.append(changes, version)
+        for change in theirs:
+            apply_change(plan, change)
+        if theirs:
+            history.invalidate(set().union(*map(touched_keys, theirs)))
+        undo = []
+        for change in changes:
+            undo[:0] = inverse(plan, change)
+            apply_change(plan, change)
+        if record:
+            history.record("edit", changes, undo, 0)
+
+    for day_id in days:
+        commit([{"op": "schedule_add", "day_id": day_id, "event_id": 5}])
+    _, theirs_version = b.load()
+    b.append([{"op": "schedule_add", "day_id": days[0], "event_id": 7}], theirs_version)
+    for _ in range(2):
+        position = history.position - 1
+        steps = history.steps_to(position)
+        commit(history.changes_to(position), record=False)
+        history.moved(steps, undone=True)
+    assert [len(history.undo_stack), len(history.redo_stack)] == [0, 2], (history.undo_stack, history.redo_stack)
+    saved, saved_version = PlanStore(path).load()
+    assert saved == plan and saved_version == version
+    assert saved["schedule"] == {"shared": [], "day1": [5, 7], "day2": [], "day3": []}, saved["schedule"]
+
+    # Replaying that undo from a stale copy must not reach the journal
+    stale = {"op": "schedule_remove", "day_id": days[2], "index": len(plan["schedule"][days[2]])}
+    try:
+        a.append([stale], version)
+    except ConflictError:
+        pass
+    else:
+        raise AssertionError("a schedule_remove past the end of the day was saved")
+    assert PlanStore(path).load()[1] == version
+    print("undo after a merge moved the right steps; a stale op was refused")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--edits", type=int, default=200, help="edits attempted per session")
+    parser.add_argument("--compact-after", type=int, default=50, help="low, so compaction races the edits")
+    parser.add_argument("--path", help="plan file to hammer (default: a temp file)")
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(), "plan_data.json")
+    PlanStore(path).save(seed(args.sessions))
+    jobs = [(path, n, args.edits, args.compact_after) for n in range(1, args.sessions + 1)]
+    with Pool(args.sessions, initializer=init_worker, initargs=(Barrier(args.sessions),)) as pool:
+        results = pool.map(session, jobs, chunksize=1)
+
+    plan, version = PlanStore(path).load()
+    on_disk = json.dumps(plan, sort_keys=True)
+    saved = sum(r[0] for r in results)
+    conflicts = sum(r[1] for r in results)
+    diverged = [n for n, r in enumerate(results, 1) if r[2] != on_disk]
+    print(f"{args.sessions} sessions: {saved} edits saved, {conflicts} rejected as conflicts, version {version}")
+    # The seed save is version 1, so every saved edit must be exactly one version after it
+    assert version == saved + 1, (version, saved)
+    assert not diverged, f"sessions {diverged} disagree with {path}"
+    print(f"all sessions match {path}")
+    check_undo_after_merge()
+
+
+if __name__ == "__main__":
+    main()
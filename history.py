@@ -0,0 +1,171 @@
+"""Undo/redo for a session's edits, as invertible journal changes.
+
+Every step keeps the changes it made and the changes that reverse them,
+worked out from the plan just before they were applied. A step therefore
+costs memory in proportion to what it changed -- a moved item is two
+indexes, a deleted event is that event (the same dict object the plan held,
+not a copy) plus where it was scheduled -- however big the plan is. Undo
+and redo are ordinary commits of those changes, so they are saved, merged
+and conflict-checked like any other edit.
+"""
+from storage import touched_keys
+
+
+def inverse(plan, change):
+    """Changes that undo ``change``, computed from the plan *before* it is applied"""
+    op = change["op"]
+    if op == "set":
+        return [{"op": "set", "field": change["field"], "value": plan[change["field"]]}]
+    if op == "upsert_event":
+        event_id = change["event"]["id"]
+        if event_id in plan["events"]:
+            return [{"op": "upsert_event", "event": plan["events"][event_id]}]
+        return [{"op": "delete_event", "event_id": event_id, "days": []}]
+    if op == "delete_event":
+        event_id = change["event_id"]
+        changes = [{"op": "upsert_event", "event": plan["events"][event_id]}]
+        # Put it back in every slot it was taken out of; ascending indexes rebuild each day exactly
+        for day_id, event_ids in plan["schedule"].items():
+            changes += [
+                {"op": "schedule_add", "day_id": day_id, "event_id": event_id, "index": index}
+                for index, item in enumerate(event_ids) if item == event_id
+            ]
+        return changes
+    if op == "add_day":
+        return [{"op": "remove_day", "day_id": change["day"]["id"]}]
+    if op == "remove_day":
+        day_id = change["day_id"]
+        index, day = next((i, d) for i, d in enumerate(plan["days"]) if d["id"] == day_id)
+        return [
+            {"op": "add_day", "day": day, "index": index},
+            {"op": "set_day", "day_id": day_id, "event_ids": list(plan["schedule"].get(day_id, []))},
+        ]
+    if op == "set_day":
+        return [{"op": "set_day", "day_id": change["day_id"], "event_ids": list(plan["schedule"][change["day_id"]])}]
+    if op == "schedule_add":
+        index = change.get("index", len(plan["schedule"][change["day_id"]]))
+        return [{"op": "schedule_remove", "day_id": change["day_id"], "index": index}]
+    if op == "schedule_remove":
+        day_id, index = change["day_id"], change["index"]
+        return [{"op": "schedule_add", "day_id": day_id, "event_id": plan["schedule"][day_id][index], "index": index}]
+    if op == "schedule_move":
+        return [{"op": "schedule_move", "day_id": change["day_id"], "index": change["to"], "to": change["index"]}]
+    raise ValueError(f"Unknown change op: {op}")
+
+
+FIELD_LABELS = {
+    "eventTitle": "Rename trip",
+    "eventDescription": "Edit description",
+    "attendeeUncertainty": "Set attendee range",
+}
+
+
+def describe(plan, change):
+    """A short label for a change, from the plan before it is applied"""
+    op = change["op"]
+
+    def event_name(event_id):
+        return plan["events"].get(event_id, {}).get('name', f"event {event_id}")
+
+    def day_label(day_id):
+        return next((d['label'] for d in plan["days"] if d['id'] == day_id), day_id)
+
+    if op == "set" and change["field"] == "attendees":
+        return f"Set attendees to {change['value']}"
+    if op == "set":
+        return FIELD_LABELS.get(change["field"], f"Set {change['field']}")
+    if op == "upsert_event":
+        verb = "Edit" if change["event"]["id"] in plan["events"] else "Add"
+        return f"{verb} {change['event']['name']}"
+    if op == "delete_event":
+        return f"Delete {event_name(change['event_id'])}"
+    if op == "add_day":
+        return f"Add {change['day']['label']}"
+    if op == "remove_day":
+        return f"Remove {day_label(change['day_id'])}"
+    if op == "set_day":
+        return f"Replace {day_label(change['day_id'])}"
+    if op == "schedule_add":
+        return f"Add {event_name(change['event_id'])} to {day_label(change['day_id'])}"
+    if op == "schedule_remove":
+        day_id = change["day_id"]
+        return f"Remove {event_name(plan['schedule'][day_id][change['index']])} from {day_label(day_id)}"
+    if op == "schedule_move":
+        day_id = change["day_id"]
+        return f"Move {event_name(plan['schedule'][day_id][change['index']])} in {day_label(day_id)}"
+    return op
+
+
+class History:
+    """Undo and redo stacks of steps: {"label", "changes", "inverse", "keys", "total"}
+
+    ``total`` is the budget total after the step, so the stacks double as a
+    record of how the budget moved over the session.
+    """
+
+    def __init__(self, start_total=0, limit=500):
+        self.start_total = start_total
+        self.limit = limit
+        self.undo_stack = []
+        self.redo_stack = []
+
+    @property
+    def position(self):
+        """Steps currently applied; 0 is the plan as the session found it"""
+        return len(self.undo_stack)
+
+    def steps(self):
+        """Every step, applied ones first, then the ones that could be redone"""
+        return self.undo_stack + self.redo_stack[::-1]
+
+    def record(self, label, changes, inverse_changes, total):
+        self.undo_stack.append({
+            "label": label,
+            "changes": list(changes),
+            "inverse": inverse_changes,
+            "keys": set().union(*map(touched_keys, changes)),
+            "total": total,
+        })
+        self.redo_stack = []
+        if len(self.undo_stack) > self.limit:
+            dropped = self.undo_stack.pop(0)
+            self.start_total = dropped["total"]
+
+    def steps_to(self, position):
+        """Steps to undo (newest first) or redo (oldest first) to get from the current position to ``position``"""
+        if position < self.position:
+            return self.undo_stack[position:][::-1]
+        return self.redo_stack[::-1][:position - self.position]
+
+    def changes_to(self, position):
+        """Changes that take the plan from the current position to ``position``"""
+        side = "inverse" if position < self.position else "changes"
+        return [change for step in self.steps_to(position) for change in step[side]]
+
+    def moved(self, steps, undone):
+        """Shift steps (from steps_to) between the stacks once their changes have been committed
+
+        Steps are matched by identity, not position: the commit may have merged
+        another session's edits and dropped older steps (see ``invalidate``),
+        which shifts every position. A step dropped that way stays dropped.
+        """
+        source, target = (self.undo_stack, self.redo_stack) if undone else (self.redo_stack, self.undo_stack)
+        for step in steps:
+            if source and source[-1] is step:
+                target.append(source.pop())
+
+    def invalidate(self, keys):
+        """Forget steps another session's edit may have invalidated
+
+        Undoing a step whose events or days someone else has since changed
+        could clobber their edit, and every older step was computed on top of
+        it, so those go too. Redo is dropped entirely.
+        """
+        keys = set(keys)
+        for i in range(len(self.undo_stack) - 1, -1, -1):
+            if self.undo_stack[i]["keys"] & keys:
+                self.start_total = self.undo_stack[i]["total"]
+                del self.undo_stack[:i + 1]
+                break
+        if any(step["keys"] & keys for step in self.redo_stack):
+            self.redo_stack = []
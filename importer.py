@@ -0,0 +1,269 @@
+"""Bulk import of vendor quote sheets (CSV or XLSX) into a plan's event library.
+
+Sheets are read a row at a time -- CSV through the csv module, XLSX by
+streaming the first worksheet's XML out of the zip -- and each row is
+mapped onto the event schema by its header (see HEADER_ALIASES), validated,
+and matched against the library by name and venue. The result is a list of
+``upsert_event`` changes to save in a single commit, plus an error for every
+row that couldn't be used. Blank cells leave a field as it is: matched
+events keep their library value and new events get the default.
+"""
+import csv
+import io
+import os
+import re
+import zipfile
+from xml.etree.ElementTree import ParseError, iterparse
+
+from core import CATEGORIES
+
+# Event field -> header spellings seen on quote sheets (compared lowercased, letters and digits only)
+HEADER_ALIASES = {
+    "name": ["name", "event", "eventname", "item", "activity", "package"],
+    "venue": ["venue", "vendor", "supplier", "restaurant", "hotel", "location"],
+    "description": ["description", "details", "notes", "remarks"],
+    "duration": ["duration", "time", "length", "session"],
+    "perPersonCost": ["perpersoncost", "perperson", "priceperperson", "costperperson", "pp", "perhead", "perpax"],
+    "minimumCost": ["minimumcost", "minimum", "min", "minspend", "minimumspend", "minimumcharge", "flatfee", "fixedcost"],
+    "category": ["category", "type", "cat"],
+}
+
+CATEGORY_ALIASES = {"fb": "food", "fnb": "food", "catering": "food", "beverage": "food", "room": "venue", "rental": "venue"}
+
+# Quote sheets often put a title or letterhead above the header row; look this far down for it
+HEADER_SEARCH_ROWS = 20
+
+XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_ROW, _CELL, _VALUE, _TEXT = (f"{XLSX_NS}{tag}" for tag in ("row", "c", "v", "t"))
+
+
+def _simplify(text):
+    return re.sub(r"[^a-z0-9]", "", str(text).lower())
+
+
+_FIELD_BY_ALIAS = {alias: field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+_CATEGORY_BY_NAME = {
+    **{_simplify(key): key for key in CATEGORIES},
+    **{_simplify(label): key for key, label in CATEGORIES.items()},
+    **CATEGORY_ALIASES,
+}
+
+
+def iter_csv(f):
+    """Rows of a CSV file object (bytes), as lists of strings"""
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        # Closing the wrapper would close the caller's file with it
+        text.detach()
+
+
+def _column(ref):
+    """Zero-based column of a cell reference such as "AB12" """
+    n = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        n = n * 26 + ord(ch.upper()) - ord("A") + 1
+    return n - 1
+
+
+def iter_xlsx(f):
+    """Rows of the first worksheet of an XLSX file object, as lists of cell values
+
+    The sheet XML is parsed incrementally and each row is dropped once read,
+    so memory stays flat however long the sheet is (shared strings, which the
+    sheet refers to by index, are the only part held in full).
+    """
+    try:
+        yield from _xlsx_rows(f)
+    except (zipfile.BadZipFile, KeyError, ParseError) as e:
+        raise ValueError(f"Not a readable XLSX file ({e})") from e
+
+
+def _xlsx_rows(f):
+    with zipfile.ZipFile(f) as book:
+        names = set(book.namelist())
+        shared = []
+        if "xl/sharedStrings.xml" in names:
+            with book.open("xl/sharedStrings.xml") as part:
+                for _, elem in iterparse(part):
+                    if elem.tag == f"{XLSX_NS}si":
+                        shared.append("".join(t.text or "" for t in elem.iter(_TEXT)))
+                        elem.clear()
+        sheet = "xl/worksheets/sheet1.xml"
+        if "xl/workbook.xml" in names and "xl/_rels/workbook.xml.rels" in names:
+            # The first sheet in tab order isn't necessarily sheet1.xml
+            with book.open("xl/workbook.xml") as part:
+                first = next(e for _, e in iterparse(part) if e.tag == f"{XLSX_NS}sheet")
+                rel_id = first.get(f"{REL_NS}id")
+            with book.open("xl/_rels/workbook.xml.rels") as part:
+                for _, elem in iterparse(part):
+                    if elem.get("Id") == rel_id:
+                        target = elem.get("Target").lstrip("/")
+                        sheet = target if target.startswith("xl/") else f"xl/{target}"
+        with book.open(sheet) as part:
+            for _, elem in iterparse(part):
+                if elem.tag != _ROW:
+                    continue
+                row = []
+                for i, cell in enumerate(elem.iter(_CELL)):
+                    ref = cell.get("r")
+                    column = _column(ref) if ref else i
+                    kind = cell.get("t")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in cell.iter(_TEXT))
+                    else:
+                        value = cell.findtext(_VALUE)
+                        if value is not None and kind == "s":
+                            value = shared[int(value)]
+                        elif value is not None and kind in (None, "n"):
+                            value = float(value)
+                    row += [None] * (column - len(row))
+                    row.append(value)
+                elem.clear()
+                yield row
+
+
+READERS = {".csv": iter_csv, ".xlsx": iter_xlsx}
+
+
+def iter_table(f, filename):
+    """Rows of an uploaded sheet, chosen by file extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Unsupported file type {extension or filename!r}; use {' or '.join(READERS)}")
+    return READERS[extension](f)
+
+
+def map_header(header):
+    """{column index: event field} for a header row; every sheet needs a name column"""
+    columns = {}
+    for i, title in enumerate(header):
+        field = _FIELD_BY_ALIAS.get(_simplify(title or ""))
+        if field and field not in columns.values():
+            columns[i] = field
+    if "name" not in columns.values():
+        raise ValueError(f"No name column found in header {[h for h in header if h]}")
+    return columns
+
+
+def parse_amount(value):
+    """A cost cell as a number: accepts 1,180 / HK$1180 / 1180.0"""
+    if isinstance(value, (int, float)):
+        amount = value
+    else:
+        text = re.sub(r"(?i)hk\$|us\$|hkd|usd|[$,\s]", "", value)
+        try:
+            amount = float(text)
+        except ValueError:
+            raise ValueError(f"{value!r} is not a number") from None
+    if amount < 0:
+        raise ValueError(f"{value!r} is negative")
+    return int(amount) if float(amount).is_integer() else amount
+
+
+def parse_category(value):
+    category = _CATEGORY_BY_NAME.get(_simplify(value))
+    if category is None:
+        raise ValueError(f"Unknown category {value!r} (expected one of {', '.join(CATEGORIES.values())})")
+    return category
+
+
+def quote_key(name, venue=""):
+    """Identity of a quote for duplicate detection: the activity and the venue, case- and spacing-blind
+
+    Library names follow "<activity> in <venue>", so a name alone or a name
+    plus separate venue column give the same key.
+    """
+    if not venue and " in " in name:
+        name, venue = name.rsplit(" in ", 1)
+    return " ".join(name.lower().split()), " ".join(venue.lower().split())
+
+
+def read_quotes(rows):
+    """Yield (sheet row number, fields or None, error or None) for the rows after the header"""
+    rows = iter(rows)
+    first_error = None
+    for number, header in enumerate(rows, start=1):
+        if all(cell in (None, "") for cell in header):
+            continue
+        try:
+            columns = map_header(header)
+            break
+        except ValueError as e:
+            first_error = first_error or e
+            if number >= HEADER_SEARCH_ROWS:
+                raise first_error
+    else:
+        if first_error:
+            raise first_error
+        return
+    for number, row in enumerate(rows, start=number + 1):
+        # Blank cells are left out, so they don't overwrite what the library has
+        values = {field: row[i] for i, field in columns.items() if i < len(row) and str(row[i] or "").strip()}
+        if not values:
+            continue
+        try:
+            name = str(values.get("name") or "").strip()
+            if not name:
+                raise ValueError("Missing name")
+            venue = str(values.get("venue") or "").strip()
+            fields = {"name": f"{name} in {venue}" if venue and " in " not in name else name}
+            for field in ("description", "duration"):
+                if field in values:
+                    fields[field] = str(values[field]).strip()
+            for field in ("perPersonCost", "minimumCost"):
+                if field in values:
+                    fields[field] = parse_amount(values[field])
+            if "category" in values:
+                fields["category"] = parse_category(values["category"])
+            yield number, fields, None
+        except ValueError as e:
+            yield number, None, str(e)
+
+
+def plan_import(rows, events, next_event_id):
+    """Work out the library changes for a quote sheet
+
+    Quotes matching a library event (see quote_key) update it, keeping any
+    field the sheet has no column for; the rest become new events with ids
+    from ``next_event_id``. When the sheet lists the same quote twice, the
+    later row wins. Returns a dict with ``changes`` (upsert_event changes,
+    ready to commit together), counts of ``added``/``updated``/``unchanged``
+    events, ``errors`` as [(row number, message)] and ``superseded`` as
+    [(row number, row that replaced it)] for the duplicates.
+    """
+    index = {quote_key(event['name']): event_id for event_id, event in events.items()}
+    pending = {}
+    errors = []
+    superseded = []
+    for number, fields, error in read_quotes(rows):
+        if error:
+            errors.append((number, error))
+            continue
+        key = quote_key(fields["name"])
+        if key in pending:
+            superseded.append((pending[key][0], number))
+        pending[key] = (number, fields)
+
+    changes = []
+    added = updated = unchanged = 0
+    for key, (_, fields) in pending.items():
+        if key in index:
+            existing = events[index[key]]
+            event = {**existing, **fields, "name": existing['name']}
+            if event == existing:
+                unchanged += 1
+                continue
+            updated += 1
+        else:
+            event = {"id": next_event_id, "name": fields["name"], "description": "", "duration": "",
+                     "perPersonCost": 0, "minimumCost": 0, "category": "other", **fields}
+            next_event_id += 1
+            added += 1
+        changes.append({"op": "upsert_event", "event": event})
+    return {"changes": changes, "added": added, "updated": updated, "unchanged": unchanged,
+            "errors": sorted(errors), "superseded": superseded}
@@ -0,0 +1,111 @@
+"""Search index over the event library: token/prefix search plus category and price filters.
+
+Kept in session state next to the budget totals and updated per change, so
+searching a catalog of thousands of vendor quotes never rescans it.
+"""
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class LibraryIndex:
+    """Inverted index from name/description/category tokens to event ids"""
+
+    def __init__(self, events, category_labels=None):
+        self.category_labels = category_labels or {}
+        self.postings = defaultdict(set)
+        self.by_category = defaultdict(set)
+        self.event_tokens = {}
+        self.event_category = {}
+        # Library order, so results come back in the order the library is shown
+        self.order = {}
+        self._next_order = 0
+        self._sorted_tokens = None
+        for event in events.values():
+            self.add(event)
+
+    def add(self, event):
+        """Index a new event or re-index an edited one"""
+        event_id = event['id']
+        if event_id in self.event_tokens:
+            self.remove(event_id, keep_order=True)
+        else:
+            self.order[event_id] = self._next_order
+            self._next_order += 1
+        category = event.get('category', 'other')
+        tokens = set(tokenize(" ".join([
+            event.get('name', ''),
+            event.get('description', ''),
+            category,
+            self.category_labels.get(category, ''),
+        ])))
+        for token in tokens:
+            if token not in self.postings:
+                self._sorted_tokens = None
+            self.postings[token].add(event_id)
+        self.event_tokens[event_id] = tokens
+        self.event_category[event_id] = category
+        self.by_category[category].add(event_id)
+
+    def remove(self, event_id, keep_order=False):
+        for token in self.event_tokens.pop(event_id, ()):
+            ids = self.postings[token]
+            ids.discard(event_id)
+            if not ids:
+                del self.postings[token]
+                self._sorted_tokens = None
+        category = self.event_category.pop(event_id, None)
+        if category is not None:
+            self.by_category[category].discard(event_id)
+        if not keep_order:
+            self.order.pop(event_id, None)
+
+    def observe(self, plan, change):
+        """Keep the index in step with a change about to be applied to plan"""
+        if change["op"] == "upsert_event":
+            self.add(change["event"])
+        elif change["op"] == "delete_event":
+            self.remove(change["event_id"])
+
+    def _prefix_matches(self, prefix):
+        """Ids of events with any token starting with prefix"""
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.postings)
+        tokens = self._sorted_tokens
+        ids = set()
+        i = bisect_left(tokens, prefix)
+        while i < len(tokens) and tokens[i].startswith(prefix):
+            ids |= self.postings[tokens[i]]
+            i += 1
+        return ids
+
+    def search(self, query="", category=None, cost_range=None, costs=None, limit=None):
+        """Ids matching every query word (as a prefix), in library order
+
+        ``cost_range`` is an inclusive (low, high) filter on ``costs[event_id]``,
+        e.g. the budget's per-event cost at the current headcount.
+        """
+        candidates = None
+        for word in tokenize(query):
+            ids = self._prefix_matches(word)
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        if category is not None:
+            ids = self.by_category.get(category, set())
+            candidates = set(ids) if candidates is None else candidates & ids
+        if candidates is None:
+            # No word or category filter: the order map already lists the whole library in order
+            results = list(self.order)
+        else:
+            results = sorted(candidates, key=self.order.__getitem__)
+        if cost_range is not None:
+            low, high = cost_range
+            results = [event_id for event_id in results if low <= costs[event_id] <= high]
+        return results[:limit] if limit is not None else results
@@ -0,0 +1,160 @@
+"""Cheapest-itinerary search over interchangeable events in the library.
+
+Events are interchangeable when they share an alternative key: an explicit
+``group`` field, or otherwise the part of the name before `` in <venue>``
+("Gala Dinner in WaterMark" and "Gala Dinner in The Verandah" are both
+"gala dinner"). Every scheduled item is a slot that may be filled by any event
+in its group; a branch-and-bound search then picks the cheapest fill(s).
+"""
+import heapq
+from collections import defaultdict
+
+from budget import calculate_event_cost
+
+
+def alternative_key(event):
+    """Group key shared by events that can stand in for each other"""
+    if event.get('group'):
+        return event['group'].strip().lower()
+    return event['name'].split(" in ")[0].strip().lower()
+
+
+def group_alternatives(events):
+    """Map each alternative key to the ids of the events in that group"""
+    groups = defaultdict(list)
+    for event_id, event in events.items():
+        groups[alternative_key(event)].append(event_id)
+    return dict(groups)
+
+
+def find_itineraries(events, days, schedule, attendees, k=1, budget_cap=None,
+                     group_counts=None, required_categories=None, node_limit=200_000):
+    """Return up to k cheapest itineraries, cheapest first
+
+    - ``budget_cap``: drop itineraries costing more than this
+    - ``group_counts``: {group key: n} -- exactly n events from that group over
+      the whole trip; slots of these groups may be left empty to get there
+    - ``required_categories``: {day id: categories} each day must still include
+
+    Returns (itineraries, complete). Each itinerary is {"total", "schedule",
+    "changes"} where changes lists (day id, old event id, new event id or None)
+    for every slot that differs. The search stops after ``node_limit`` nodes;
+    ``complete`` is False if it did, in which case the itineraries are only the
+    best found so far and cheaper ones may exist.
+    """
+    group_counts = group_counts or {}
+    required_categories = required_categories or {}
+    groups = group_alternatives(events)
+    costs = {event_id: calculate_event_cost(event, attendees) for event_id, event in events.items()}
+
+    # Options for a group, cheapest first; None means "leave the slot empty"
+    options_by_group = {}
+    for key, event_ids in groups.items():
+        options = sorted(event_ids, key=lambda event_id: costs[event_id])
+        if key in group_counts:
+            options = [None] + options
+        options_by_group[key] = options
+
+    slots = []
+    for day in days:
+        for event_id in schedule.get(day['id'], []):
+            key = alternative_key(events[event_id])
+            slots.append((day['id'], event_id, key, options_by_group[key]))
+    scheduled_days = {slot[0] for slot in slots}
+    if any(cats and day_id not in scheduled_days for day_id, cats in required_categories.items()):
+        return [], True
+
+    # Lower bound on what the remaining slots must add, ignoring constraints (limited groups
+    # count as 0 here, since their slots may be left empty; see still_needed below)
+    n = len(slots)
+    min_rest = [0.0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        options = slots[i][3]
+        min_rest[i] = min_rest[i + 1] + (0 if options[0] is None else costs[options[0]])
+
+    # Categories still reachable in the rest of each slot's day, and where each day ends
+    reachable = [set() for _ in range(n)]
+    day_end = [False] * n
+    for i in range(n - 1, -1, -1):
+        cats = {events[e].get('category', 'other') for e in slots[i][3] if e is not None}
+        same_day = i + 1 < n and slots[i + 1][0] == slots[i][0]
+        reachable[i] = cats | (reachable[i + 1] if same_day else set())
+        day_end[i] = not same_day
+
+    # Slots left per limited group, for "can we still hit the exact count" checks
+    slots_left = defaultdict(lambda: [0] * (n + 1))
+    for key in group_counts:
+        left = slots_left[key]
+        for i in range(n - 1, -1, -1):
+            left[i] = left[i + 1] + (slots[i][2] == key)
+    # Counts the schedule can't reach are ruled out before searching at all
+    if any(slots_left[key][0] < count for key, count in group_counts.items()):
+        return [], True
+    # Cheapest way to fill one more slot of each limited group (an event may fill several)
+    cheapest = {key: costs[options_by_group[key][1]] if count else 0 for key, count in group_counts.items()}
+
+    best = []  # max-heap of the k best via (-total, counter, choices)
+    counter = 0
+    nodes = 0
+    choices = [None] * n
+    used = defaultdict(int)
+
+    def pruned(bound):
+        if budget_cap is not None and bound > budget_cap:
+            return True
+        # Ties with the worst kept itinerary can't improve the result
+        return len(best) == k and bound >= -best[0][0]
+
+    def still_needed():
+        """What the limited groups' outstanding events must add at the least"""
+        return sum((count - used[key]) * cheapest[key] for key, count in group_counts.items())
+
+    def search(i, total, day_cats):
+        nonlocal counter, nodes
+        nodes += 1
+        if nodes > node_limit or pruned(total + min_rest[i] + still_needed()):
+            return
+        if i == n:
+            if any(used[key] != count for key, count in group_counts.items()):
+                return
+            counter += 1
+            item = (-total, counter, list(choices))
+            if len(best) < k:
+                heapq.heappush(best, item)
+            else:
+                heapq.heapreplace(best, item)
+            return
+
+        day_id, _, key, options = slots[i]
+        missing = set(required_categories.get(day_id, ())) - day_cats
+        if missing - reachable[i]:
+            return
+        for option in options:
+            if key in group_counts:
+                taken = used[key] + (option is not None)
+                # Too many already, or too few slots left to reach the count
+                if taken > group_counts[key] or taken + slots_left[key][i + 1] < group_counts[key]:
+                    continue
+            cats = day_cats
+            if option is not None:
+                cats = day_cats | {events[option].get('category', 'other')}
+            if day_end[i] and set(required_categories.get(day_id, ())) - cats:
+                continue
+            choices[i] = option
+            used[key] += option is not None
+            search(i + 1, total + (0 if option is None else costs[option]), set() if day_end[i] else cats)
+            used[key] -= option is not None
+
+    search(0, 0.0, set())
+
+    results = []
+    for neg_total, _, picked in sorted(best, key=lambda item: -item[0]):
+        new_schedule = {day['id']: [] for day in days if day['id'] in schedule}
+        changes = []
+        for (day_id, old_id, _, _), new_id in zip(slots, picked):
+            if new_id is not None:
+                new_schedule[day_id].append(new_id)
+            if new_id != old_id:
+                changes.append((day_id, old_id, new_id))
+        results.append({"total": -neg_total, "schedule": new_schedule, "changes": changes})
+    return results, nodes <= node_limit
@@ -0,0 +1,193 @@
+"""How events are priced: cost models for vendor quotes, and exchange rates.
+
+An event is priced from ``perPersonCost`` and ``minimumCost`` as before,
+max(perPersonCost * attendees, minimumCost), unless it carries a ``pricing``
+dict for a quote that doesn't fit that shape. Every key is optional:
+
+    {"unitCost": 4500, "unitSize": 50}      # per vehicle/boat/room: a coach per 50 people
+    {"tiers": [[50, 880], [100, 820]]}      # per-person rate from 50 and from 100 people on
+    {"fixed": 8000}                         # room hire on top of the per-person charge
+    {"maximum": 120000}                     # the quote's cap
+
+so the cost of every event, in the currency it was quoted in, is
+
+    min(max(fixed + rate * n + unitCost * ceil(n / unitSize), minimumCost), maximum)
+
+where ``rate`` is perPersonCost, or the rate of the highest tier the
+headcount ``n`` reaches. An event's ``currency`` (default HKD) converts the
+result to HKD, which is what every total is kept in. A currency with no
+rate in the table (a plan or catalog from a server with other rates, say)
+prices at 0 rather than failing; has_rate() lets the UI flag those events.
+
+event_cost() prices one event (budget.calculate_event_cost uses it);
+compile_events() packs a whole library into arrays so evaluate() can price
+it for any number of headcounts, and in any currency, in one NumPy call.
+"""
+import json
+import math
+import os
+
+# HKD per unit of each currency. fx_rates.json in the working directory, e.g.
+# {"USD": 7.8, "EUR": 8.45, "CNY": 1.08}, adds currencies or overrides these.
+DEFAULT_FX_RATES = {"HKD": 1.0, "USD": 7.8}
+FX_FILE = "fx_rates.json"
+
+
+def load_fx_rates(path=FX_FILE):
+    rates = dict(DEFAULT_FX_RATES)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            rates.update({code.upper(): float(rate) for code, rate in json.load(f).items()})
+    return rates
+
+
+FX_RATES = load_fx_rates()
+
+
+def has_rate(event, rates=FX_RATES):
+    """Whether the table can convert an event's quote currency to HKD"""
+    return event.get('currency', 'HKD') in rates
+
+
+def convert(amount, to, rates=FX_RATES):
+    """An HKD amount in another currency"""
+    return amount if to == "HKD" else amount / rates[to]
+
+
+def event_cost(event, attendees, rates=FX_RATES):
+    """An event's cost in HKD for a headcount"""
+    pricing = event.get('pricing')
+    currency = event.get('currency', 'HKD')
+    if not pricing and currency == 'HKD':
+        return max(event.get('perPersonCost', 0) * attendees, event.get('minimumCost', 0))
+    pricing = pricing or {}
+    rate = event.get('perPersonCost', 0)
+    for start, tier_rate in sorted(pricing.get('tiers', ())):
+        if attendees >= start:
+            rate = tier_rate
+    cost = pricing.get('fixed', 0) + rate * attendees
+    if pricing.get('unitCost'):
+        cost += pricing['unitCost'] * math.ceil(attendees / (pricing.get('unitSize') or 1))
+    cost = max(cost, event.get('minimumCost', 0))
+    if pricing.get('maximum') is not None:
+        cost = min(cost, pricing['maximum'])
+    return cost * rates.get(currency, 0) if currency != 'HKD' else cost
+
+
+def compile_events(events, rates=FX_RATES):
+    """Pack a sequence of events' pricing into arrays, one row per event, for evaluate()"""
+    # Imported here: budget imports this module, and pricing one event doesn't need NumPy
+    import numpy as np
+
+    events = list(events)
+    # Most events are plain per-person/minimum quotes; only the rest need their model unpacked
+    models = [(e, event['pricing']) for e, event in enumerate(events) if event.get('pricing')]
+    width = 1 + max((len(model.get('tiers', ())) for _, model in models), default=0)
+    per_person = np.array([event.get('perPersonCost', 0) for event in events], dtype=float)
+    compiled = {
+        "per_person": per_person,
+        "minimum": np.array([event.get('minimumCost', 0) for event in events], dtype=float),
+        "fixed": np.zeros(len(events)),
+        "unit_cost": np.zeros(len(events)),
+        "unit_size": np.ones(len(events)),
+        "maximum": np.full(len(events), np.inf),
+        "fx": np.array([rates.get(event.get('currency', 'HKD'), 0) for event in events], dtype=float),
+        # Row e: headcounts each rate starts at (unused slots never start) and the rates
+        "tier_from": np.full((len(events), width), np.inf),
+        "tier_rate": np.zeros((len(events), width)),
+    }
+    compiled["tier_from"][:, 0] = 0
+    compiled["tier_rate"][:, 0] = per_person
+    for e, model in models:
+        compiled["fixed"][e] = model.get('fixed', 0)
+        compiled["unit_cost"][e] = model.get('unitCost', 0)
+        compiled["unit_size"][e] = model.get('unitSize') or 1
+        if model.get('maximum') is not None:
+            compiled["maximum"][e] = model['maximum']
+        for k, (start, rate) in enumerate(sorted(model.get('tiers', ())), start=1):
+            compiled["tier_from"][e, k] = start
+            compiled["tier_rate"][e, k] = rate
+    return compiled
+
+
+def select(compiled, rows):
+    """The compiled rows picked by a boolean mask, index array or slice"""
+    return {key: values[rows] for key, values in compiled.items()}
+
+
+def evaluate(compiled, attendees, per_person=None, minimum=None, unit_cost=None, currency="HKD", rates=FX_RATES):
+    """Cost of every compiled event at each headcount in ``attendees``, shaped (headcounts, events)
+
+    ``per_person``, ``minimum`` and ``unit_cost`` replace the quoted amounts,
+    broadcast against that shape (the risk simulation passes one row of draws
+    per headcount). A replacement per-person rate scales tiered rates by the
+    same factor.
+    """
+    import numpy as np
+
+    n = np.asarray(attendees, dtype=float).reshape(-1, 1)
+    shape = (len(n), len(compiled["per_person"]))
+    rate = compiled["per_person"] if per_person is None else per_person
+    tiered = np.flatnonzero(np.isfinite(compiled["tier_from"][:, 1:]).any(axis=1))
+    if len(tiered):
+        # Look brackets up only for the tiered events; the rest keep their one rate
+        bracket = (compiled["tier_from"][tiered] <= n[:, :, None]).sum(axis=2) - 1
+        tier_rate = compiled["tier_rate"][tiered[None], bracket]
+        if per_person is not None:
+            base = compiled["per_person"][tiered]
+            drawn = np.broadcast_to(per_person, shape)[:, tiered]
+            tier_rate = tier_rate * np.where(base > 0, drawn / np.where(base > 0, base, 1), 1)
+        rate = np.array(np.broadcast_to(rate, shape))
+        rate[:, tiered] = tier_rate
+    cost = rate * n
+    # Terms no event uses are skipped: a library of plain per-person quotes costs one multiply and a max
+    if compiled["fixed"].any():
+        cost += compiled["fixed"]
+    unit_cost = compiled["unit_cost"] if unit_cost is None else np.broadcast_to(unit_cost, shape)
+    per_unit = np.flatnonzero(unit_cost.any(axis=0) if unit_cost.ndim == 2 else unit_cost)
+    if len(per_unit):
+        cost[:, per_unit] += unit_cost[..., per_unit] * np.ceil(n / compiled["unit_size"][per_unit])
+    cost = np.maximum(cost, compiled["minimum"] if minimum is None else minimum)
+    if np.isfinite(compiled["maximum"]).any():
+        cost = np.minimum(cost, compiled["maximum"])
+    if (compiled["fx"] != 1).any():
+        cost *= compiled["fx"]
+    return cost if currency == "HKD" else cost / rates[currency]
+
+
+def parse_tiers(text):
+    """Tiers from the editor's "from:rate" list, e.g. "50:880, 100:820" """
+    tiers = []
+    for part in text.replace(";", ",").split(","):
+        if not part.strip():
+            continue
+        start, _, rate = part.partition(":")
+        try:
+            tiers.append([int(start), float(rate)])
+        except ValueError:
+            raise ValueError(f"{part.strip()!r} is not from:rate, e.g. 50:880") from None
+    return sorted(tiers)
+
+
+def format_tiers(tiers):
+    return ", ".join(f"{start}:{rate:g}" for start, rate in tiers)
+
+
+def describe(event):
+    """One line on a pricing model, for library cards; empty for the plain per-person/minimum shape"""
+    pricing = event.get('pricing') or {}
+    currency = event.get('currency', 'HKD')
+    parts = []
+    if pricing.get('fixed'):
+        parts.append(f"{currency} {pricing['fixed']:,.0f} fixed")
+    if pricing.get('unitCost'):
+        parts.append(f"{currency} {pricing['unitCost']:,.0f} per {pricing.get('unitSize') or 1} people")
+    for start, rate in sorted(pricing.get('tiers', ())):
+        parts.append(f"{currency} {rate:,.0f}/person from {start}")
+    if pricing.get('maximum') is not None:
+        parts.append(f"capped at {currency} {pricing['maximum']:,.0f}")
+    if currency != 'HKD' and not parts:
+        parts.append(f"quoted in {currency}")
+    if not has_rate(event):
+        parts.append(f"⚠️ no {currency} exchange rate, counted as 0")
+    return " · ".join(parts)
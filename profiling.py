@@ -0,0 +1,188 @@
+"""Opt-in profiling of each rerun: where the time goes, section by section.
+
+Turned on per page with ``?profile=1`` in the URL, or for every session with
+PLANNER_PROFILE=1 in the server's environment. For every section of the page
+it records the wall time, the number of calculate_event_cost calls and the
+number of widgets created. Each full run, or each set of fragments rerun
+together (a click's own fragment plus the totals it updates), then becomes
+one record, kept for rolling p50/p95 per interaction (the journal ops it
+committed, e.g. ``schedule_move``) and appended as one JSON line to
+``profile_log.jsonl`` so runs can be aggregated across sessions.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import budget
+import optimizer
+
+ENV_FLAG = "PLANNER_PROFILE"
+LOG_PATH = "profile_log.jsonl"
+
+_calls = threading.local()
+_log_lock = threading.Lock()
+
+
+def enabled(query_params):
+    return os.environ.get(ENV_FLAG) == "1" or query_params.get("profile") == "1"
+
+
+def _counted(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        # Per thread, and each session's script runs on its own thread
+        _calls.count = getattr(_calls, "count", 0) + 1
+        return fn(*args, **kwargs)
+    wrapper.counted = True
+    return wrapper
+
+
+def instrument():
+    """Count calculate_event_cost calls everywhere the planner looks the function up"""
+    for module in (budget, optimizer):
+        if not getattr(module.calculate_event_cost, "counted", False):
+            module.calculate_event_cost = _counted(module.calculate_event_cost)
+
+
+def cost_calls():
+    return getattr(_calls, "count", 0)
+
+
+def widget_count():
+    """Widgets registered so far in the current run (0 outside a script run)"""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return 0
+    # Moved from the context onto ctx.shared in newer Streamlit versions
+    ids = getattr(getattr(ctx, "shared", ctx), "widget_ids_this_run", None)
+    if ids is None:
+        return 0
+    return len(ids.snapshot()) if hasattr(ids, "snapshot") else len(ids)
+
+
+def fragments_this_run():
+    """The fragment ids the current script run is rerunning (None for a full run)
+
+    Streamlit hands each run a new list, so it also tells one fragment run from the next.
+    """
+    ctx = get_script_run_ctx()
+    return ctx.fragment_ids_this_run if ctx is not None else None
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+class RunProfiler:
+    """One session's profile: the sections of the run in progress plus rolling history"""
+
+    def __init__(self, session_id, window=100, log_path=LOG_PATH):
+        self.session_id = session_id
+        self.window = window
+        self.log_path = log_path
+        self.sections = {}
+        # Journal ops committed since the last record, e.g. from a widget callback
+        self.pending_ops = []
+        self.full_run = False
+        # Fragment rerun whose sections are being collected, and their time so far
+        self.fragment_run = None
+        self.fragment_ms = 0
+        self._depth = 0
+        self.history = {}
+        self.last = None
+
+    def note(self, op):
+        self.pending_ops.append(op)
+
+    def begin(self):
+        """Start a full run of the script
+
+        When the previous run was cut short by st.rerun() (say, right after a
+        commit), its sections carry over, so the record covers the whole click.
+        """
+        self.close_fragments()
+        if not self.full_run:
+            self.sections = {}
+        self.full_run = True
+        self._depth = 0
+
+    @contextmanager
+    def section(self, name):
+        """Time a section; sections run more than once a run (one per day column) add up"""
+        # A fragment rerun runs only its fragments' (outermost) sections; those of one
+        # run are collected into one record
+        fragment = not self.full_run and self._depth == 0
+        if fragment:
+            run = fragments_this_run()
+            if run is not self.fragment_run or run is None:
+                self.close_fragments()
+                self.sections = {}
+                self.fragment_run = run
+        self._depth += 1
+        calls, widgets = cost_calls(), widget_count()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            totals = self.sections.setdefault(name, {"ms": 0, "costCalls": 0, "widgets": 0, "runs": 0})
+            totals["ms"] += (time.perf_counter() - started) * 1000
+            totals["costCalls"] += cost_calls() - calls
+            totals["widgets"] += widget_count() - widgets
+            totals["runs"] += 1
+            if fragment:
+                self.fragment_ms += (time.perf_counter() - started) * 1000
+                if not self.fragment_run or len(self.fragment_run) == 1:
+                    self.close_fragments()
+
+    def close_fragments(self):
+        """Record the fragment rerun collected so far, if any
+
+        A run of one fragment is recorded as soon as its section ends; a run of
+        several when the profile panel draws (it reruns last) or else when the
+        next run starts.
+        """
+        if self.fragment_run is None and not self.fragment_ms:
+            return
+        total_ms = self.fragment_ms
+        self.fragment_run = None
+        self.fragment_ms = 0
+        self.finish("fragment", total_ms)
+
+    def finish(self, kind, total_ms):
+        """Close the current run as a record, add it to the history and the log"""
+        interaction = "+".join(dict.fromkeys(self.pending_ops)) or "view"
+        self.pending_ops = []
+        self.full_run = False
+        record = {
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "session": self.session_id,
+            "kind": kind,
+            "interaction": interaction,
+            "totalMs": total_ms,
+            "sections": self.sections,
+        }
+        self.history.setdefault(f"{kind}: {interaction}", deque(maxlen=self.window)).append(total_ms)
+        self.last = record
+        with _log_lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        return record
+
+    def stats(self):
+        """{interaction: (runs, p50 ms, p95 ms)} over the last ``window`` runs of each"""
+        return {
+            interaction: (len(times), percentile(times, 50), percentile(times, 95))
+            for interaction, times in self.history.items()
+        }
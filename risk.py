@@ -0,0 +1,138 @@
+"""Monte Carlo budget risk: how much the schedule might really cost.
+
+Library events may carry an ``uncertainty`` dict giving a distribution for
+``perPersonCost``, ``minimumCost`` and/or ``unitCost`` (of a per-unit
+pricing model), and the plan may give one for the headcount
+(``attendeeUncertainty``). A distribution is a dict such as
+
+    {"dist": "triangular", "low": 700, "high": 1100}   # mode defaults to the point value
+    {"dist": "uniform", "low": 8000, "high": 13000}
+    {"dist": "normal", "sd": 50}                         # mean defaults to the point value
+
+Every draw prices the whole schedule with budget.calculate_event_cost's rule,
+each event's pricing model (see pricing.py), for all draws at once in NumPy.
+Amounts are drawn in the currency the event was quoted in.
+"""
+import numpy as np
+
+from pricing import evaluate, select
+from sweep import pack_plan
+
+PERCENTILES = (50, 90, 99)
+
+# Draws are made in chunks of about this many (draw, event) cells, ~16 MB per
+# float array, so memory stays flat however many events are scheduled
+CHUNK_CELLS = 2_000_000
+
+# Pricing array -> event field an uncertainty spec can give a distribution for
+DRAWN_AMOUNTS = {"per_person": "perPersonCost", "minimum": "minimumCost", "unit_cost": "unitCost"}
+
+
+def draw(spec, point, rng, size):
+    """Sample a distribution spec around a point estimate; None means the point value itself"""
+    if not spec:
+        return np.full(size, float(point))
+    dist = spec.get("dist", "triangular")
+    if dist == "triangular":
+        low, high = spec["low"], spec["high"]
+        mode = min(max(spec.get("mode", point), low), high)
+        if low == high:
+            return np.full(size, float(low))
+        return rng.triangular(low, mode, high, size)
+    if dist == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if dist == "normal":
+        # Prices and headcounts can't go negative
+        return np.maximum(rng.normal(spec.get("mean", point), spec["sd"], size), 0)
+    raise ValueError(f"Unknown distribution: {dist}")
+
+
+def draw_columns(specs, field, points, rng, size):
+    """(size, events) draws of one amount, or None when no event has a distribution for it"""
+    columns = [e for e, spec in enumerate(specs) if spec.get(field)]
+    if not columns:
+        return None
+    values = np.tile(points, (size, 1))
+    for e in columns:
+        values[:, e] = draw(specs[e][field], points[e], rng, size)
+    return values
+
+
+def simulate(events, schedule, days, attendees, attendee_spec=None, draws=100_000, chunk=None, seed=0):
+    """Simulate the schedule's cost ``draws`` times
+
+    Returns a dict with
+    - ``total``: {"mean", "p50", "p90", "p99"} of the trip total
+    - ``per_day``: {day id: {"p50", "p90", "p99"}}
+    - ``drivers``: [(event id, share of total variance)], largest first; shares
+      are each event's covariance with the total over the total's variance, so
+      they add up to 1
+    - ``totals``: every simulated total, for plotting
+
+    Draws are made ``chunk`` at a time (by default sized from CHUNK_CELLS
+    and the number of scheduled events) to bound memory on big schedules.
+    Only events with an uncertainty spec get drawn amounts; the rest are
+    priced from their point values.
+    """
+    packed = pack_plan(events, schedule, days)
+    scheduled = np.flatnonzero(packed["counts"].any(axis=1))
+    # Events with no uncertainty spec first, so each group is one block of columns
+    uncertain = np.array([bool(events[packed["event_ids"][e]].get("uncertainty")) for e in scheduled], dtype=bool)
+    scheduled = scheduled[np.argsort(uncertain, kind="stable")]
+    fixed = len(uncertain) - int(uncertain.sum())
+    event_ids = [packed["event_ids"][e] for e in scheduled]
+    pricing = select(packed["pricing"], scheduled)
+    counts = packed["counts"][scheduled]
+    times = counts.sum(axis=1)
+    fixed_pricing = select(pricing, slice(None, fixed))
+    drawn_pricing = select(pricing, slice(fixed, None))
+    drawn_specs = [events[event_id]["uncertainty"] for event_id in event_ids[fixed:]]
+    if chunk is None:
+        chunk = max(1, CHUNK_CELLS // max(1, len(event_ids)))
+
+    rng = np.random.default_rng(seed)
+    totals = np.empty(draws)
+    # Only read for percentiles; single precision halves the biggest array at a million draws
+    per_day = np.empty((draws, len(packed["day_ids"])), dtype=np.float32)
+    # Running sums for each event's covariance with the total
+    sum_cost = np.zeros(len(event_ids))
+    sum_cost_total = np.zeros(len(event_ids))
+
+    for start in range(0, draws, chunk):
+        n = min(chunk, draws - start)
+        heads = np.round(draw(attendee_spec, attendees, rng, n))
+        event_costs = np.empty((n, len(event_ids)))
+        if fixed:
+            event_costs[:, :fixed] = evaluate(fixed_pricing, heads)
+        if drawn_specs:
+            amounts = {
+                name: draw_columns(drawn_specs, field, drawn_pricing[name], rng, n)
+                for name, field in DRAWN_AMOUNTS.items()
+            }
+            event_costs[:, fixed:] = evaluate(drawn_pricing, heads, **amounts)
+        day_costs = event_costs @ counts
+        chunk_totals = day_costs.sum(axis=1)
+        totals[start:start + n] = chunk_totals
+        per_day[start:start + n] = day_costs
+        scheduled_costs = event_costs * times
+        sum_cost += scheduled_costs.sum(axis=0)
+        sum_cost_total += scheduled_costs.T @ chunk_totals
+
+    mean = totals.mean()
+    variance = totals.var()
+    covariance = sum_cost_total / draws - (sum_cost / draws) * mean
+    shares = covariance / variance if variance > 0 else np.zeros(len(event_ids))
+    order = np.argsort(-shares)
+    day_percentiles = np.percentile(per_day, PERCENTILES, axis=0, overwrite_input=True)
+    total_percentiles = np.percentile(totals, PERCENTILES)
+    return {
+        "draws": draws,
+        "total": {"mean": mean, **{f"p{p}": v for p, v in zip(PERCENTILES, total_percentiles)}},
+        "per_day": {
+            day_id: {f"p{p}": day_percentiles[i, d] for i, p in enumerate(PERCENTILES)}
+            for d, day_id in enumerate(packed["day_ids"])
+        },
+        # Fixed-price events only pick up floating-point noise; leave them out
+        "drivers": [(event_ids[e], shares[e]) for e in order if shares[e] > 1e-6],
+        "totals": totals,
+    }
@@ -0,0 +1,433 @@
+"""Plan persistence: atomic JSON snapshots plus an append-only change journal.
+
+The snapshot (``plan_data.json``) holds the whole plan as of journal sequence
+number ``seq``. Every edit made in the app is appended to
+``plan_data.json.journal`` as one small JSON line, so saving costs the same
+whether the plan has ten items or ten thousand. Once the journal grows past
+``compact_after`` lines it is folded back into the snapshot on a background
+thread.
+
+Several sessions (or server processes) can edit the same file: the journal
+seq doubles as the plan's version, and a save made against an older version
+is merged if it touches different events/days than the edits it missed, or
+rejected with ConflictError if it doesn't.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: sessions in one server process are still serialized
+    fcntl = None
+
+# Plan fields persisted in the snapshot
+PLAN_FIELDS = (
+    "eventTitle",
+    "eventDescription",
+    "attendees",
+    "nextEventId",
+    "nextDayId",
+    "events",
+    "days",
+    "schedule",
+    "attendeeUncertainty",
+)
+
+
+def events_from_list(events):
+    """Index a list of event dicts by id, keeping library order"""
+    return {event["id"]: event for event in events}
+
+
+def apply_change(plan, change):
+    """Apply one journal change to a plan (a dict or st.session_state) in place"""
+    op = change["op"]
+    if op == "set":
+        plan[change["field"]] = change["value"]
+    elif op == "upsert_event":
+        event = change["event"]
+        plan["events"][event["id"]] = event
+        plan["nextEventId"] = max(plan["nextEventId"], event["id"] + 1)
+    elif op == "delete_event":
+        event_id = change["event_id"]
+        plan["events"].pop(event_id, None)
+        schedule = plan["schedule"]
+        for day_id, event_ids in schedule.items():
+            if event_id in event_ids:
+                schedule[day_id] = [i for i in event_ids if i != event_id]
+    elif op == "add_day":
+        day = change["day"]
+        # An index puts a removed day back where it was (undo); new days go last
+        plan["days"].insert(change.get("index", len(plan["days"])), day)
+        plan["schedule"][day["id"]] = []
+        plan["nextDayId"] += 1
+    elif op == "remove_day":
+        day_id = change["day_id"]
+        plan["days"] = [d for d in plan["days"] if d["id"] != day_id]
+        plan["schedule"].pop(day_id, None)
+    elif op == "set_day":
+        plan["schedule"][change["day_id"]] = list(change["event_ids"])
+    elif op == "schedule_add":
+        items = plan["schedule"][change["day_id"]]
+        items.insert(change.get("index", len(items)), change["event_id"])
+    elif op == "schedule_remove":
+        plan["schedule"][change["day_id"]].pop(change["index"])
+    elif op == "schedule_move":
+        items = plan["schedule"][change["day_id"]]
+        items.insert(change["to"], items.pop(change["index"]))
+    else:
+        raise ValueError(f"Unknown change op: {op}")
+
+
+def touched_keys(change):
+    """Stable ids of the things a change reads or writes: ("event", id), ("day", id) or ("field", name)
+
+    Two changes conflict when their keys overlap. Schedule ops include the event
+    they place, so adding an event to a day clashes with deleting that event.
+    """
+    op = change["op"]
+    if op == "set":
+        return {("field", change["field"])}
+    if op == "upsert_event":
+        # New events take their id from nextEventId, so two at once share an id and clash here
+        return {("event", change["event"]["id"])}
+    if op == "delete_event":
+        # "days" lists the days the event was stripped from, when the writer knew them
+        return {("event", change["event_id"])} | {("day", day_id) for day_id in change.get("days", ())}
+    if op == "add_day":
+        return {("day", change["day"]["id"]), ("field", "nextDayId")}
+    if op == "remove_day":
+        return {("day", change["day_id"])}
+    if op == "set_day":
+        return {("day", change["day_id"])} | {("event", event_id) for event_id in change["event_ids"]}
+    if op == "schedule_add":
+        return {("day", change["day_id"]), ("event", change["event_id"])}
+    if op in ("schedule_remove", "schedule_move"):
+        return {("day", change["day_id"])}
+    raise ValueError(f"Unknown change op: {op}")
+
+
+class ConflictError(Exception):
+    """A save based on an old version touched something another session changed since, or no longer applies"""
+
+    def __init__(self, version, keys):
+        self.version = version
+        self.keys = keys
+        super().__init__(f"Plan changed to version {version} since this edit was made ({sorted(map(str, keys)) or 'history compacted'})")
+
+
+def write_atomic(path, text, durable=True):
+    """Write text to path via a temp file + rename so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class FileLock:
+    """Exclusive access across threads and, where flock exists, across processes
+
+    Used as ``with lock:``. Processes coordinate through an flock on the file
+    at ``path``, which is created on first use and never removed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                self._file = open(self.path, "a")
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if self._file is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+                self._file.close()
+                self._file = None
+        finally:
+            self._thread_lock.release()
+
+
+class PlanStore:
+    """Snapshot + journal storage for a single plan file, safe to share between processes
+
+    The plan's version is the seq of the last journal record. It is also kept
+    in a tiny ``.version`` file so sessions can poll for other editors' changes
+    without reading the plan. Writes are optimistic: ``append`` takes the
+    version the changes were made against and rejects them only if a newer
+    record touches the same event, day or field (see ``touched_keys``).
+    """
+
+    def __init__(self, path, compact_after=500):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.version_path = f"{path}.version"
+        self.lock_path = f"{path}.lock"
+        self.compact_after = compact_after
+        # Latest version this process knows is folded into the snapshot
+        self._folded = 0
+        # The saved plan as of _plan_seq, kept to check appends apply before writing them
+        self._plan = None
+        self._plan_seq = 0
+        self._lock = FileLock(self.lock_path)
+        self._compactor = None
+
+    def _read_snapshot(self):
+        """Return (plan, seq) from the snapshot file, or (None, 0) if there is none"""
+        if not os.path.exists(self.path):
+            return None, 0
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        # Older files are a bare plan without the seq/plan wrapper
+        plan = data.get("plan", data)
+        if isinstance(plan.get("events"), list):
+            plan["events"] = events_from_list(plan["events"])
+        # Added after the first plans were saved
+        plan.setdefault("attendeeUncertainty", None)
+        return plan, data.get("seq", 0)
+
+    def _read_journal(self):
+        """Return all complete journal records in order"""
+        if not os.path.exists(self.journal_path):
+            return []
+        records = []
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append; nothing after it was committed
+                    break
+        return records
+
+    def _repair_journal(self):
+        """End the journal at a complete line; call with the lock held
+
+        A crash mid-append can leave a torn last line. Reads stop there, so
+        anything appended after it would be lost: the torn part is cut off
+        (or, if the record is whole and only its newline is missing, ended).
+        """
+        try:
+            with open(self.journal_path, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size == 0:
+                    return
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    return
+                f.seek(0)
+                data = f.read()
+                cut = data.rfind(b"\n") + 1
+                try:
+                    json.loads(data[cut:])
+                    f.write(b"\n")
+                except ValueError:
+                    f.truncate(cut)
+                f.flush()
+                os.fsync(f.fileno())
+        except FileNotFoundError:
+            pass
+
+    def _snapshot_text(self, plan, seq):
+        data = {key: plan[key] for key in PLAN_FIELDS}
+        # Events are keyed by id in memory but kept as a list on disk
+        data["events"] = list(plan["events"].values())
+        return json.dumps({
+            "seq": seq,
+            "savedAt": datetime.now().isoformat(timespec="seconds"),
+            "plan": data,
+        }, indent=2)
+
+    def _replay(self):
+        """Rebuild the latest plan from disk, returning (plan, seq, records applied on top of the snapshot)"""
+        plan, seq = self._read_snapshot()
+        records = [r for r in self._read_journal() if r["seq"] > seq]
+        if plan is None:
+            return None, seq, records
+        for change in records:
+            apply_change(plan, change)
+            seq = change["seq"]
+        return plan, seq, records
+
+    def _write_version(self, version):
+        # Derivable from the journal, so it is not worth an fsync per edit
+        write_atomic(self.version_path, str(version), durable=False)
+
+    def _current_version(self):
+        """The version on disk; call with the lock held"""
+        try:
+            with open(self.version_path, encoding="utf-8") as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            _, seq, _ = self._replay()
+            self._write_version(seq)
+            return seq
+
+    def _records_since(self, version):
+        """Journal records newer than version, or None if some were already folded into the snapshot"""
+        records = [r for r in self._read_journal() if r["seq"] > version]
+        current = self._current_version()
+        if current > version and (not records or records[0]["seq"] != version + 1):
+            return None
+        return records
+
+    def version(self):
+        """Cheap poll of the latest version, for noticing other sessions' edits"""
+        try:
+            with open(self.version_path, encoding="utf-8") as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def load(self, default=None):
+        """Load the latest saved plan as (plan, version)
+
+        If nothing has been saved yet, ``default`` (when given) is saved as the
+        first version and returned; otherwise the plan is None.
+        """
+        with self._lock:
+            self._repair_journal()
+            plan, seq, records = self._replay()
+            if plan is None and default is not None:
+                seq = self._save(default)
+                return default, seq
+            self._folded = seq - len(records)
+            # A crash between writes leaves the version file behind the journal, or
+            # ahead of it; ahead is kept, since sessions may have seen those versions
+            current = self._current_version()
+            if current < seq:
+                self._write_version(seq)
+            return plan, max(seq, current)
+
+    def read(self):
+        """Latest saved plan as (plan, version) without locking or writing anything, for read-only tools"""
+        plan, seq, _ = self._replay()
+        return plan, seq
+
+    def _save(self, plan):
+        version = self._current_version() + 1
+        write_atomic(self.path, self._snapshot_text(plan, version))
+        write_atomic(self.journal_path, "")
+        self._write_version(version)
+        self._folded = version
+        self._plan = None
+        return version
+
+    def save(self, plan):
+        """Write a full snapshot over whatever is saved and start a fresh journal; returns the new version"""
+        with self._lock:
+            return self._save(plan)
+
+    def changes_since(self, version):
+        """Return (records, latest version) for catching up from version
+
+        Records is None when the session is too far behind to replay (the
+        journal has been compacted past it) and should ``load`` instead.
+        """
+        with self._lock:
+            return self._records_since(version), self._current_version()
+
+    def _check_applies(self, records, version):
+        """Apply records to the saved plan as of version, raising ConflictError (and forgetting the plan) if one fails
+
+        Call with the lock held. A stale index in a schedule op would otherwise
+        be written, and every later load would fail replaying it.
+        """
+        if self._plan is None:
+            catch_up = None
+        elif self._plan_seq == version:
+            catch_up = []
+        else:
+            catch_up = self._records_since(self._plan_seq)
+        if catch_up is None:
+            self._plan, self._plan_seq, _ = self._replay()
+            catch_up = []
+        if self._plan is None:
+            return
+        try:
+            for record in [*catch_up, *records]:
+                apply_change(self._plan, record)
+        except (KeyError, IndexError, ValueError):
+            # Possibly half-applied; rebuilt from disk next time
+            self._plan = None
+            raise ConflictError(version, touched_keys(record)) from None
+        self._plan_seq = records[-1]["seq"] if records else version
+
+    def append(self, changes, base_version=None):
+        """Append changes made against base_version; returns (new version, records from other writers)
+
+        Records other sessions appended since base_version are returned so the
+        caller can apply them before its own changes, leaving its copy of the
+        plan identical to the one on disk. Raises ConflictError if any of them
+        touch the same event, day or field as ``changes``, or if ``changes``
+        don't apply to the saved plan (an index past the end of a day, say);
+        nothing is written then.
+        Compaction is kicked off when the journal gets long.
+        """
+        with self._lock:
+            self._repair_journal()
+            version = self._current_version()
+            theirs = []
+            if base_version is not None and base_version != version:
+                theirs = self._records_since(base_version)
+                if theirs is None:
+                    raise ConflictError(version, set())
+                ours = set().union(*map(touched_keys, changes))
+                clashes = ours & set().union(*map(touched_keys, theirs))
+                if clashes:
+                    raise ConflictError(version, clashes)
+            lines = []
+            for change in changes:
+                lines.append(json.dumps({"seq": version + len(lines) + 1, **change}) + "\n")
+            # Checked on copies parsed back from the lines, so the kept plan shares nothing with the caller's
+            self._check_applies(list(map(json.loads, lines)), version)
+            version += len(lines)
+            # Version first: a crash in between leaves a gap in seqs, never a reused seq
+            self._write_version(version)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+                f.flush()
+            if version - self._folded >= self.compact_after and not self.compacting:
+                self._compactor = threading.Thread(target=self.compact, daemon=True)
+                self._compactor.start()
+            return version, theirs
+
+    @property
+    def compacting(self):
+        return self._compactor is not None and self._compactor.is_alive()
+
+    def compact(self):
+        """Fold the journal into a new snapshot without blocking appends for the whole rewrite"""
+        with self._lock:
+            plan, seq, records = self._replay()
+        if plan is None or not records:
+            return
+        text = self._snapshot_text(plan, seq)
+        with self._lock:
+            journal = self._read_journal()
+            # Another process compacted past seq (or saved over the plan) meanwhile; its snapshot is newer
+            if not any(r["seq"] == seq for r in journal):
+                self._folded = max(self._folded, seq)
+                return
+            write_atomic(self.path, text)
+            # Keep anything appended while the snapshot was being written
+            remaining = [r for r in journal if r["seq"] > seq]
+            write_atomic(self.journal_path, "".join(json.dumps(r) + "\n" for r in remaining))
+            self._folded = seq
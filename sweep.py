@@ -0,0 +1,74 @@
+"""Vectorized attendee sweeps and break-even headcounts for the cost model.
+
+Same semantics as budget.calculate_event_cost -- each event's pricing model,
+see pricing.py -- but evaluated for a whole range of attendee counts at once.
+"""
+import numpy as np
+
+from pricing import compile_events, evaluate, select
+
+
+def pack_plan(events, schedule, days):
+    """Pack the library and schedule into columnar arrays
+
+    ``counts[e, d]`` is how many times library event ``e`` is scheduled on day ``d``;
+    ``pricing`` is the library compiled by pricing.compile_events, in the same order.
+    """
+    event_ids = list(events)
+    position = {event_id: i for i, event_id in enumerate(event_ids)}
+    day_ids = [day['id'] for day in days]
+    counts = np.zeros((len(event_ids), len(day_ids)))
+    for d, day_id in enumerate(day_ids):
+        for event_id in schedule.get(day_id, []):
+            counts[position[event_id], d] += 1
+    pricing = compile_events(events[i] for i in event_ids)
+    return {
+        "event_ids": event_ids,
+        "day_ids": day_ids,
+        "per_person": pricing["per_person"],
+        "minimum": pricing["minimum"],
+        "pricing": pricing,
+        "counts": counts,
+    }
+
+
+def sweep(packed, attendees, currency="HKD"):
+    """Total, per-day and per-person cost for every attendee count in ``attendees``
+
+    Returns arrays shaped (A,), (A, days) and (A,), in ``currency``.
+    """
+    attendees = np.atleast_1d(np.asarray(attendees, dtype=float))
+    # Only scheduled events contribute, so leave the rest of the library out of the matrix
+    scheduled = packed["counts"].any(axis=1)
+    event_costs = evaluate(select(packed["pricing"], scheduled), attendees, currency=currency)
+    per_day = event_costs @ packed["counts"][scheduled]
+    total = per_day.sum(axis=1)
+    per_person = np.divide(total, attendees, out=np.zeros_like(total), where=attendees > 0)
+    return {"attendees": attendees, "total": total, "per_day": per_day, "per_person": per_person}
+
+
+def break_even(packed, limit=1000):
+    """Smallest headcount at which each event's headcount-driven charges exceed its minimum
+
+    Events with no such charges never break even (``inf``); events with no
+    minimum are per-person from the first attendee. Plain per-person quotes
+    are solved directly; tiered and per-unit ones, whose charges step, are
+    priced at every headcount up to ``limit`` (``inf`` if none gets there).
+    """
+    pricing = packed["pricing"]
+    per_person = pricing["per_person"]
+    minimum = pricing["minimum"]
+    result = np.full(per_person.shape, np.inf)
+    stepped = np.isfinite(pricing["tier_from"][:, 1:]).any(axis=1) | (pricing["unit_cost"] > 0)
+    priced = ~stepped & (per_person > 0)
+    result[priced] = np.maximum(np.floor((minimum[priced] - pricing["fixed"][priced]) / per_person[priced]) + 1, 1)
+    result[stepped & (minimum <= 0)] = 1
+    stepped &= minimum > 0
+    if stepped.any():
+        rows = select(pricing, stepped)
+        # Without the minimum (and the cap, which only ever lowers a cost) this is the variable charge
+        rows["maximum"] = np.full(len(rows["minimum"]), np.inf)
+        charges = evaluate(rows, np.arange(1, limit + 1), minimum=0) / rows["fx"]
+        above = charges > rows["minimum"]
+        result[stepped] = np.where(above.any(axis=0), above.argmax(axis=0) + 1, np.inf)
+    return result
@@ -0,0 +1,156 @@
+"""A workspace of many plans sharing one vendor catalog.
+
+Layout of a workspace directory:
+
+    index.json          title, days, attendees, total and version of every plan
+    catalog.json        vendor events any plan can copy into its own library
+    plans/<id>.json     one PlanStore (snapshot + journal) per plan
+
+Listing plans reads only ``index.json``; a plan's own files are opened the
+first time someone opens that plan. The index is updated by whichever
+session saves a plan, so it can lag behind a file edited by hand until
+``rebuild_index()`` is run.
+"""
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+from core import normalize_plan, plan_summary, seed_plan
+from storage import FileLock, PlanStore, events_from_list, write_atomic
+
+
+def slugify(title):
+    return re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-") or "plan"
+
+
+def index_entry(plan, total, version, updated=None):
+    """What the plan list needs to know about a plan, without opening it"""
+    return {
+        "title": plan["eventTitle"],
+        "days": len(plan["days"]),
+        "attendees": plan["attendees"],
+        "total": total,
+        "version": version,
+        "updated": (updated or datetime.now()).isoformat(timespec="seconds"),
+    }
+
+
+class Workspace:
+    """Many plans under one directory; safe to share between sessions and processes"""
+
+    def __init__(self, root):
+        self.root = root
+        self.plans_dir = os.path.join(root, "plans")
+        self.index_path = os.path.join(root, "index.json")
+        self.catalog_path = os.path.join(root, "catalog.json")
+        self.lock_path = os.path.join(root, "workspace.lock")
+        # Guards the index and catalog
+        self._lock = FileLock(self.lock_path)
+        # Opened on first use, then kept for every session on this server
+        self._stores = {}
+        self._stores_lock = threading.Lock()
+        # (file stamp, entries) of the last index read, so polling it is a stat() call
+        self._index = (None, {})
+        os.makedirs(self.plans_dir, exist_ok=True)
+        if not os.path.exists(self.index_path):
+            self.rebuild_index()
+        if not self.plans():
+            self.create(seed_plan())
+        if not os.path.exists(self.catalog_path):
+            # Start the catalog off with the IAPN vendors
+            self.save_catalog(seed_plan()["events"])
+
+    def plan_path(self, plan_id):
+        return os.path.join(self.plans_dir, f"{plan_id}.json")
+
+    def store(self, plan_id):
+        """The PlanStore for a plan, created the first time the plan is opened"""
+        with self._stores_lock:
+            if plan_id not in self._stores:
+                self._stores[plan_id] = PlanStore(self.plan_path(plan_id))
+            return self._stores[plan_id]
+
+    # Index
+
+    def plans(self):
+        """{plan id: metadata} from the index, most recently saved first"""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return {}
+        # Every write replaces the file, so a new inode or size catches writes within one mtime tick
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if stamp != self._index[0]:
+            with open(self.index_path, encoding="utf-8") as f:
+                entries = json.load(f)
+            ordered = dict(sorted(entries.items(), key=lambda item: item[1].get("updated", ""), reverse=True))
+            self._index = (stamp, ordered)
+        return self._index[1]
+
+    def _write_index(self, entries):
+        write_atomic(self.index_path, json.dumps(entries, indent=2), durable=False)
+
+    def record(self, plan_id, plan, total, version):
+        """Update a plan's index entry after a save"""
+        with self._lock:
+            entries = dict(self.plans())
+            entries[plan_id] = index_entry(plan, total, version)
+            self._write_index(entries)
+
+    def rebuild_index(self):
+        """Re-read every plan file and write the index from scratch"""
+        entries = {}
+        for name in sorted(os.listdir(self.plans_dir)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.plans_dir, name)
+            plan, version = PlanStore(path).read()
+            if plan is None:
+                continue
+            plan = normalize_plan(plan)
+            entries[name[:-len(".json")]] = index_entry(
+                plan, plan_summary(plan)["total"], version, datetime.fromtimestamp(os.path.getmtime(path))
+            )
+        with self._lock:
+            self._write_index(entries)
+        return entries
+
+    def create(self, plan):
+        """Save a new plan under an id made from its title; returns the id"""
+        with self._lock:
+            base = plan_id = slugify(plan["eventTitle"])
+            n = 1
+            while plan_id in self.plans() or os.path.exists(self.plan_path(plan_id)):
+                n += 1
+                plan_id = f"{base}-{n}"
+            version = self.store(plan_id).save(plan)
+            entries = dict(self.plans())
+            entries[plan_id] = index_entry(plan, plan_summary(plan)["total"], version)
+            self._write_index(entries)
+        return plan_id
+
+    # Catalog
+
+    def catalog_mtime(self):
+        """Changes whenever the catalog is saved; a cheap cache key for load_catalog()"""
+        return os.stat(self.catalog_path).st_mtime_ns
+
+    def load_catalog(self):
+        """Vendor events keyed by catalog id"""
+        with open(self.catalog_path, encoding="utf-8") as f:
+            return events_from_list(json.load(f))
+
+    def save_catalog(self, events):
+        write_atomic(self.catalog_path, json.dumps(list(events.values()), indent=2))
+
+    def add_to_catalog(self, event):
+        """Add a copy of a plan's event to the catalog, replacing a vendor entry of the same name"""
+        with self._lock:
+            events = self.load_catalog() if os.path.exists(self.catalog_path) else {}
+            existing = next((e["id"] for e in events.values() if e["name"] == event["name"]), None)
+            catalog_id = existing if existing is not None else max(events, default=0) + 1
+            events[catalog_id] = {**event, "id": catalog_id}
+            self.save_catalog(events)
+        return catalog_id